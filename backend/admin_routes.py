@@ -1,16 +1,27 @@
 # backend/admin_routes.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+import base64
+import hashlib
+import json
+import redis
 import models
-from sqlalchemy import func
+from sqlalchemy import func, or_, tuple_, case, type_coerce, Float
+from sqlalchemy.dialects.postgresql import ARRAY, array
 from database import get_db
 from dependencies import get_current_user
+from identity import invalidate_identity
+from logging_config import logger
+from transcription_cache import transcription_cache
+import scheduling
+from timeline import DURATION_BUCKETS, LONGEST_BUCKET
 from schemas import User as UserSchema, UserListResponse, UploadedFile as UploadedFileSchema, UserActivity as UserActivitySchema, UpdateTimeRequest, DiscountCode, DiscountCodeCreate, DiscountCodeUpdate
-from datetime import datetime
+from datetime import datetime, timedelta
 
 admin_router = APIRouter(prefix="/admin", tags=["admin"])
+redis_client = redis.Redis(host='redis', port=6379, db=0)
 
 def get_admin_user(request: Request, db: Session = Depends(get_db)) -> models.User:
     user = get_current_user(request, db)
@@ -20,26 +31,99 @@ def get_admin_user(request: Request, db: Session = Depends(get_db)) -> models.Us
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized as admin")
     return user
 
+USER_SORT_FIELDS = ('id', 'email', 'name', 'remaining_time', 'total_used_time', 'last_login')
+EPOCH = datetime(1970, 1, 1)
+USER_COUNT_CACHE_TTL = 300  # seconds; like the /files total, a hint for the pager
+
+def user_count_key(search: str) -> str:
+    return "users_total:" + hashlib.sha1(search.lower().encode('utf-8')).hexdigest()
+
+def cached_user_count(query, search: str) -> int:
+    key = user_count_key(search)
+    try:
+        cached = redis_client.get(key)
+        if cached is not None:
+            return int(cached)
+    except redis.RedisError as e:
+        logger.warning(f"User count cache unavailable: {e}")
+    total = query.with_entities(func.count(models.User.id)).scalar()
+    try:
+        redis_client.set(key, total, ex=USER_COUNT_CACHE_TTL)
+    except redis.RedisError:
+        pass
+    return total
+
+def encode_user_cursor(value, user_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, user_id]).encode('utf-8')).decode('ascii')
+
+def decode_user_cursor(cursor: str, sort: str):
+    try:
+        value, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if sort == 'last_login':
+            value = datetime.fromisoformat(value)
+        return value, int(user_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @admin_router.get("/users", response_model=UserListResponse)
-def list_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), admin_user: models.User = Depends(get_admin_user)):
-    total_users = db.query(func.count(models.User.id)).scalar()
-    users = db.query(models.User).offset(skip).limit(limit).all()
-    user_list = []
-    for user in users:
-        successful_jobs = db.query(models.UploadedFile).filter(
-            models.UploadedFile.user_id == user.id,
-            models.UploadedFile.status == 'transcribed'
-        ).count()
-        unsuccessful_jobs = db.query(models.UploadedFile).filter(
-            models.UploadedFile.user_id == user.id,
-            models.UploadedFile.status.in_(['error', 'failed'])
-        ).count()
-        last_login_activity = db.query(models.UserActivity).filter(
-            models.UserActivity.user_id == user.id,
-            models.UserActivity.activity_type == 'login'
-        ).order_by(models.UserActivity.timestamp.desc()).first()
-        last_login = last_login_activity.timestamp if last_login_activity else None
-        user_schema = UserSchema(
+def list_users(
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=500),
+    search: Optional[str] = None,
+    sort: str = Query('id', pattern='^(' + '|'.join(USER_SORT_FIELDS) + ')$'),
+    order: str = Query('asc', pattern='^(asc|desc)$'),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: Session = Depends(get_db),
+    admin_user: models.User = Depends(get_admin_user)
+):
+    """
+    One page of users. Job counts and last login are the counters kept on User (see
+    user_stats.py), so a page costs one indexed query whatever the table size.
+    Pass next_cursor back as cursor for keyset paging; skip still works. The total is
+    cached per search term for a few minutes, and skipped with include_total=false.
+    Search matches anywhere in email or name, served by the trigram indexes in init_db.py.
+    """
+    sort_columns = {
+        'id': models.User.id,
+        'email': models.User.email,
+        'name': models.User.name,
+        'remaining_time': func.coalesce(models.User.remaining_time, 0.0),
+        'total_used_time': func.coalesce(models.User.total_used_time, 0.0),
+        'last_login': func.coalesce(models.User.last_login, EPOCH),
+    }
+    sort_column = sort_columns[sort]
+
+    query = db.query(models.User)
+    search = (search or '').strip()
+    if search:
+        pattern = f"%{search}%"
+        query = query.filter(or_(models.User.email.ilike(pattern), models.User.name.ilike(pattern)))
+    total_users = cached_user_count(query, search) if include_total else None
+
+    query = query.add_columns(sort_column.label('sort_value'))
+    descending = order == 'desc'
+    if cursor:
+        value, user_id = decode_user_cursor(cursor, sort)
+        position = tuple_(sort_column, models.User.id)
+        query = query.filter(position < tuple_(value, user_id) if descending else position > tuple_(value, user_id))
+    if descending:
+        query = query.order_by(sort_column.desc(), models.User.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), models.User.id.asc())
+    if not cursor:
+        query = query.offset(skip)
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_user, last_value = rows[-1]
+        next_cursor = encode_user_cursor(last_value, last_user.id)
+    user_list = [
+        UserSchema(
             id=user.id,
             email=user.email,
             name=user.name,
@@ -47,13 +131,14 @@ def list_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), a
             is_admin=user.is_admin,
             remaining_time=user.remaining_time,
             expiration_date=user.expiration_date,
-            successful_jobs=successful_jobs,
-            failed_jobs=unsuccessful_jobs,
+            successful_jobs=user.successful_jobs or 0,
+            failed_jobs=user.failed_jobs or 0,
             total_used_time=user.total_used_time,
-            last_login=last_login
+            last_login=user.last_login
         )
-        user_list.append(user_schema)
-    return UserListResponse(total=total_users, users=user_list)
+        for user, _ in rows
+    ]
+    return UserListResponse(total=total_users, users=user_list, next_cursor=next_cursor)
 
 @admin_router.get("/users/{user_id}/files", response_model=List[UploadedFileSchema])
 def get_user_files(user_id: int, db: Session = Depends(get_db), admin_user: models.User = Depends(get_admin_user)):
@@ -82,6 +167,7 @@ def update_user_time(
     if user.remaining_time < 0:
         user.remaining_time = 0
     db.commit()
+    invalidate_identity(user.id)
     db.refresh(user)
     return {"user_id": user.id, "new_remaining_time": user.remaining_time}
 
@@ -96,6 +182,84 @@ def get_user_stats(user_id: int, db: Session = Depends(get_db), admin_user: mode
     ).scalar() or 0
     return {"user_id": user.id, "total_completed_duration": total_completed_duration}
 
+@admin_router.get("/transcription-cache")
+def get_transcription_cache_stats(admin_user: models.User = Depends(get_admin_user)):
+    return transcription_cache.stats()
+
+@admin_router.get("/queues")
+def get_queue_stats(admin_user: models.User = Depends(get_admin_user)):
+    """Depth and recent wait times (seconds) per transcription lane, for sizing workers."""
+    return {
+        "queues": scheduling.queue_stats(),
+        "short_job_max_seconds": scheduling.SHORT_JOB_MAX_SECONDS,
+        "max_active_jobs_per_user": scheduling.MAX_ACTIVE_JOBS_PER_USER,
+    }
+
+LATENCY_STAGES = (
+    'download_wait', 'download', 'media_wait', 'prepare', 'queue_wait',
+    'probe', 'normalize', 'chunk', 'api', 'render', 'db_commit', 'processing',
+)
+LATENCY_PERCENTILES = (0.5, 0.95, 0.99)
+
+@admin_router.get("/job-latency")
+def get_job_latency(
+    hours: int = Query(24, ge=1, le=24 * 90),
+    job_status: str = Query('transcribed', alias='status', pattern='^(transcribed|error)$'),
+    by: str = Query('both', pattern='^(language|duration|both)$'),
+    db: Session = Depends(get_db),
+    admin_user: models.User = Depends(get_admin_user)
+):
+    """
+    p50/p95/p99 seconds per stage of the job timelines (see timeline.JobTimeline) finished in
+    the last `hours`, overall and grouped by language and/or duration bucket. The window is
+    a range scan on ix_uploaded_files_finished_at; a stage a job skipped doesn't count for it.
+    """
+    since = datetime.utcnow() - timedelta(hours=hours)
+    duration_bucket = case(
+        *[(func.coalesce(models.UploadedFile.media_duration, 0) < limit, label) for limit, label in DURATION_BUCKETS],
+        else_=LONGEST_BUCKET
+    )
+    stage_columns = []
+    for stage in LATENCY_STAGES:
+        seconds = models.UploadedFile.timeline[('stages', stage)].as_float()
+        stage_columns += [func.count(seconds), type_coerce(func.percentile_cont(array(LATENCY_PERCENTILES)).within_group(seconds), ARRAY(Float))]
+
+    group_columns = []
+    if by in ('language', 'both'):
+        group_columns.append(models.UploadedFile.language.label('language'))
+    if by in ('duration', 'both'):
+        group_columns.append(duration_bucket.label('duration_bucket'))
+
+    def query(*columns):
+        return db.query(*columns, func.count(models.UploadedFile.id), *stage_columns).filter(
+            models.UploadedFile.finished_at >= since,
+            models.UploadedFile.status == job_status,
+            models.UploadedFile.timeline.isnot(None)
+        )
+
+    def summarize(values):
+        jobs, stats = values[0], values[1:]
+        stages = {}
+        for index, stage in enumerate(LATENCY_STAGES):
+            count, percentiles = stats[2 * index], stats[2 * index + 1]
+            if count:
+                stages[stage] = {"jobs": count, **{
+                    f"p{round(fraction * 100)}": round(value, 2) for fraction, value in zip(LATENCY_PERCENTILES, percentiles)
+                }}
+        return {"jobs": jobs, "stages": stages}
+
+    overall = query().one()
+    groups = query(*group_columns).group_by(*group_columns).order_by(*group_columns).all()
+    return {
+        "window_hours": hours,
+        "status": job_status,
+        "overall": summarize(tuple(overall)),
+        "groups": [
+            dict(zip(row._fields[:len(group_columns)], row[:len(group_columns)]), **summarize(tuple(row[len(group_columns):])))
+            for row in groups
+        ],
+    }
+
 @admin_router.post("/discount_codes", response_model=DiscountCode)
 def create_discount_code(
     discount_code: DiscountCodeCreate,
@@ -0,0 +1,100 @@
+# backend/callbacks.py
+
+import json
+import os
+import random
+import threading
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+
+CALLBACK_TIMEOUT = (5, 30)  # connect, read
+CALLBACK_MAX_RETRIES = int(os.getenv('CALLBACK_MAX_RETRIES', '8'))
+CALLBACK_BACKOFF = 30        # seconds before the first retry, doubled each attempt
+CALLBACK_BACKOFF_MAX = 3600
+# Batch mode: with a window > 0, results for the same host are collected for that many
+# seconds and sent together as {"results": [...]} (at most CALLBACK_BATCH_SIZE per POST)
+CALLBACK_BATCH_WINDOW = float(os.getenv('CALLBACK_BATCH_WINDOW', '0'))
+CALLBACK_BATCH_SIZE = int(os.getenv('CALLBACK_BATCH_SIZE', '50'))
+
+redis_client = redis.Redis(host='redis', port=6379, db=0)
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+class PermanentCallbackError(Exception):
+    """The partner rejected the callback (4xx); retrying the same body won't help."""
+
+def callback_host(url: str) -> str:
+    return (urlsplit(url).hostname or '').lower()
+
+def session_for(host: str) -> requests.Session:
+    """One keep-alive session per partner host, shared by every delivery in the worker process."""
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=10)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({'Content-Type': 'application/json'})
+            _sessions[host] = session
+        return session
+
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff with jitter for the attempt-th retry (0-based)."""
+    return min(CALLBACK_BACKOFF * 2 ** attempt, CALLBACK_BACKOFF_MAX) * random.uniform(0.75, 1.25)
+
+def callback_payload(uploaded_file) -> dict:
+    return {
+        "file_id": uploaded_file.id,
+        "upload_token": uploaded_file.external_upload_token,
+        "status": "completed" if uploaded_file.status == 'transcribed' else "error",
+        "language": uploaded_file.language,
+        "destination_language": uploaded_file.destination_language,
+        "media_duration": uploaded_file.media_duration,
+        "transcription": uploaded_file.transcription if uploaded_file.status == 'transcribed' else None,
+    }
+
+def post_callback(url: str, body: dict) -> requests.Response:
+    """
+    POST body to url over the host's session. Raises PermanentCallbackError for a 4xx
+    (other than 408/429) and requests.RequestException for anything worth retrying.
+    """
+    response = session_for(callback_host(url)).post(url, data=json.dumps(body), timeout=CALLBACK_TIMEOUT)
+    if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+        raise PermanentCallbackError(f"HTTP {response.status_code}: {response.text[:200]}")
+    response.raise_for_status()
+    return response
+
+def _batch_key(host: str) -> str:
+    return f"callback_batch:{host}"
+
+def add_to_batch(host: str, file_id: int) -> bool:
+    """
+    Queue file_id for the host's next batch. Returns True if the caller should schedule
+    the batch task, i.e. no batch for this host is already waiting.
+    """
+    pipe = redis_client.pipeline()
+    pipe.rpush(_batch_key(host), file_id)
+    pipe.set(f"{_batch_key(host)}:scheduled", 1, nx=True, ex=int(CALLBACK_BATCH_WINDOW) + 300)
+    return bool(pipe.execute()[1])
+
+def take_batch(host: str) -> Tuple[List[int], bool]:
+    """
+    Pop up to CALLBACK_BATCH_SIZE queued file ids. Also returns whether more are waiting,
+    in which case the caller schedules the next batch (the scheduled flag stays set).
+    """
+    key = _batch_key(host)
+    pipe = redis_client.pipeline()
+    pipe.lrange(key, 0, CALLBACK_BATCH_SIZE - 1)
+    pipe.ltrim(key, CALLBACK_BATCH_SIZE, -1)
+    pipe.llen(key)
+    items, _, remaining = pipe.execute()
+    if not remaining:
+        redis_client.delete(f"{key}:scheduled")
+        # An id queued between the trim and the delete saw the flag set and scheduled nothing
+        remaining = redis_client.llen(key) and redis_client.set(f"{key}:scheduled", 1, nx=True, ex=int(CALLBACK_BATCH_WINDOW) + 300)
+    return [int(item) for item in items], bool(remaining)
@@ -1,6 +1,7 @@
 # backend/celery_config.py
 
 from celery import Celery
+from celery.signals import worker_init, worker_ready, worker_process_shutdown
 from kombu import Queue, Exchange
 
 celery_app = Celery(
@@ -13,16 +14,24 @@ celery_app = Celery(
 # Define exchanges
 default_exchange = Exchange('default', type='direct')
 transcription_exchange = Exchange('transcription', type='direct')
+media_exchange = Exchange('media', type='direct')
 
 # Define queues with their exchanges
 celery_app.conf.task_queues = (
     Queue('default', default_exchange, routing_key='default'),
-    Queue('transcription', transcription_exchange, routing_key='transcription.#'),
+    Queue('transcription', transcription_exchange, routing_key='transcription.#'),  # pre-lane messages
+    # Lanes picked per job by scheduling.transcription_queue
+    Queue('transcription_priority', transcription_exchange, routing_key='transcription.priority'),
+    Queue('transcription_short', transcription_exchange, routing_key='transcription.short'),
+    Queue('transcription_long', transcription_exchange, routing_key='transcription.long'),
+    # ffmpeg work (probing, audio extraction), kept off the I/O-bound gevent workers
+    Queue('media', media_exchange, routing_key='media'),
 )
 
 # Route tasks to specific queues
 celery_app.conf.task_routes = {
-    'tasks.transcribe_file': {'queue': 'transcription'},
+    'tasks.transcribe_file': {'queue': 'transcription_long'},
+    'tasks.prepare_media': {'queue': 'media'},
 }
 
 # Celery configuration for handling long-running tasks
@@ -37,7 +46,8 @@ celery_app.conf.update(
     
     # Worker settings
     worker_max_tasks_per_child=50,  # Restart worker after 50 tasks
-    worker_concurrency=5,  # Number of worker processes
+    worker_concurrency=5,  # Number of worker processes (greenlets with -P gevent)
+    worker_prefetch_multiplier=1,  # Reserve one job per slot so queued jobs stay visible to other workers
     
     # Result backend settings
     result_expires=24000,  # Results expire after about 6 hours
@@ -46,6 +56,8 @@ celery_app.conf.update(
     broker_connection_retry_on_startup=True,
     broker_connection_max_retries=10,
     broker_connection_timeout=90,
+    # Workers drain the queues in the order given to -Q, so the priority lane always goes first
+    broker_transport_options={'queue_order_strategy': 'priority'},
     
     # Task acknowledgment
     task_acks_late=True,  # Tasks are acknowledged after completion
@@ -63,4 +75,34 @@ celery_app.conf.update(
 celery_app.conf.task_routes.update({
     'tasks.cleanup_files': {'queue': 'default'},
     'tasks.health_check': {'queue': 'default'},
-})
\ No newline at end of file
+    'tasks.ingest_remote_audio': {'queue': 'default'},
+    'tasks.deliver_callback': {'queue': 'default'},
+    'tasks.deliver_callback_batch': {'queue': 'default'},
+    'tasks.summarize_file': {'queue': 'default'},
+})
+
+@worker_init.connect
+def make_psycopg_cooperative(**kwargs):
+    """
+    The transcription workers run with -P gevent: many ElevenLabs calls in flight per
+    process. gevent patches sockets, but psycopg2 talks to Postgres from C, so it needs
+    psycogreen's wait callback to yield to other greenlets while a query runs.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return
+    if monkey.is_module_patched('socket'):
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+@worker_ready.connect
+def serve_metrics(**kwargs):
+    """Each worker container exposes its processes' metrics on CELERY_METRICS_PORT for Prometheus."""
+    import metrics
+    metrics.start_worker_exporter()
+
+@worker_process_shutdown.connect
+def forget_pool_process(pid=None, **kwargs):
+    import metrics
+    metrics.mark_process_dead(pid)
@@ -1,16 +1,41 @@
 # backend/database.py
 
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import metrics
 
 DATABASE_URL = os.getenv('DATABASE_URL', 'postgresql://tuttyuser:tuttypassword@db:5432/tuttydb')
+ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL', DATABASE_URL.replace('postgresql://', 'postgresql+asyncpg://', 1))
 
-engine = create_engine(DATABASE_URL)
+# Per process: uvicorn workers and Celery child processes each get their own pool, so
+# workers * (size + overflow) must stay below Postgres' max_connections. With the defaults:
+# API 4 workers * 2 engines * 10 = 80, the three gevent workers (long, short, default) 10
+# each (their greenlets share the pool and hold a connection only while a transaction is
+# open), media 2 children * 10 = 20, 130 in all against max_connections=200 in docker-compose.yml
+POOL_OPTIONS = dict(
+    pool_size=int(os.getenv('DB_POOL_SIZE', '5')),
+    max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '5')),
+    pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '10')),
+    pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '1800')),  # seconds; stay under proxy/server idle timeouts
+    pool_pre_ping=True,
+)
+
+engine = create_engine(DATABASE_URL, **POOL_OPTIONS)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# asyncpg engine for async routes, so queries don't block the event loop
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **POOL_OPTIONS)
+
+# Statement timings and per-request query counts for /metrics
+metrics.instrument_engine(engine, 'sync')
+metrics.instrument_engine(async_engine.sync_engine, 'async')
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 # Dependency to get DB session
@@ -21,6 +46,10 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Placeholder for get_current_user function
 def get_current_user(user_id: int = None):
     return user_id
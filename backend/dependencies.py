@@ -1,13 +1,66 @@
 # backend/dependencies.py
 
+from typing import Optional
 from fastapi import Request, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from models import User
-from database import get_db
+from database import get_db, get_async_db, AsyncSessionLocal
+from identity import Identity, cached_identity, cache_identity
 
 def get_current_user(request: Request, db: Session = Depends(get_db)):
+    """
+    The session's User row, loaded at most once per request.
+
+    Endpoints that call this directly and through Depends get the same object, and the
+    identity is recorded on request.state for the logging middleware.
+    """
+    user_id = request.session.get('user_id')
+    if user_id is None:
+        return None
+    user = getattr(request.state, 'current_user', None)
+    if user is None or user.id != user_id:
+        user = db.query(User).filter(User.id == user_id).first()
+        request.state.current_user = user
+        if user:
+            identity = Identity.from_user(user)
+            request.state.identity = identity
+            cache_identity(identity)
+    return user
+
+async def get_current_user_async(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """get_current_user for routes on the async session."""
     user_id = request.session.get('user_id')
     if user_id is None:
         return None
-    user = db.query(User).filter(User.id == user_id).first()
+    user = getattr(request.state, 'current_user_async', None)
+    if user is None or user.id != user_id:
+        user = await db.get(User, user_id)
+        request.state.current_user_async = user
+        if user:
+            identity = Identity.from_user(user)
+            request.state.identity = identity
+            cache_identity(identity)
     return user
+
+async def get_current_identity(request: Request) -> Optional[Identity]:
+    """
+    The session user's id, email, admin flag and balance without touching the database
+    when possible: request.state first, then the short-lived Redis cache.
+    """
+    user_id = request.session.get('user_id')
+    if user_id is None:
+        return None
+    identity = getattr(request.state, 'identity', None)
+    if identity is not None and identity.id == user_id:
+        return identity
+    identity = cached_identity(user_id)
+    if identity is None:
+        async with AsyncSessionLocal() as db:
+            user = await db.get(User, user_id)
+        if user is None:
+            return None
+        identity = Identity.from_user(user)
+        cache_identity(identity)
+    request.state.identity = identity
+    return identity
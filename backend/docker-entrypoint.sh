@@ -0,0 +1,11 @@
+#!/bin/sh
+# backend/docker-entrypoint.sh
+# Every container (API and Celery workers) starts with an empty Prometheus multiprocess
+# directory: samples left by a previous run would be summed in, and prometheus_client
+# fails at import if the directory is missing.
+set -e
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+exec "$@"
@@ -0,0 +1,59 @@
+# backend/events.py
+
+import json
+import os
+from typing import Optional, Tuple
+import redis
+from logging_config import logger
+
+EVENT_STREAM_MAXLEN = int(os.getenv('EVENT_STREAM_MAXLEN', '200'))         # events kept per user (approximate)
+EVENT_STREAM_TTL = int(os.getenv('EVENT_STREAM_TTL', str(24 * 3600)))      # idle user streams expire
+
+redis_client = redis.Redis(host='redis', port=6379, db=0)
+
+def user_channel(user_id: int) -> str:
+    return f"user_{user_id}_updates"
+
+def user_stream(user_id: int) -> str:
+    return f"user_{user_id}_events"
+
+def publish_user_event(user_id: int, event: dict, client: redis.Redis = redis_client) -> Optional[str]:
+    """
+    Record an event in the user's capped stream, then push it to live SSE connections.
+
+    The stream entry ID (monotonic per user) travels with the pub/sub message so the SSE
+    endpoint can emit it as the event id and a reconnecting browser can resume after it.
+    Returns the entry ID, or None if Redis was unavailable; like the bare publish this
+    replaces, a failure here never fails the job.
+    """
+    data = json.dumps(event)
+    try:
+        pipe = client.pipeline()
+        pipe.xadd(user_stream(user_id), {"data": data}, maxlen=EVENT_STREAM_MAXLEN, approximate=True)
+        pipe.expire(user_stream(user_id), EVENT_STREAM_TTL)
+        event_id = pipe.execute()[0].decode('utf-8')
+        client.publish(user_channel(user_id), json.dumps({"id": event_id, "data": data}))
+        return event_id
+    except redis.RedisError as e:
+        logger.error(f"Failed to publish event for user {user_id}: {e}")
+        return None
+
+def parse_event_id(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Parse a stream ID like '1718000000000-3' into a comparable tuple, or None if malformed."""
+    if not value:
+        return None
+    millis, _, sequence = value.strip().partition('-')
+    try:
+        return int(millis), int(sequence or 0)
+    except ValueError:
+        return None
+
+def unpack_message(message: str) -> Tuple[Optional[str], str]:
+    """Split a pub/sub payload into (event_id, data); bare payloads from older publishers have no id."""
+    try:
+        envelope = json.loads(message)
+    except ValueError:
+        return None, message
+    if isinstance(envelope, dict) and set(envelope) == {"id", "data"}:
+        return envelope["id"], envelope["data"]
+    return None, message
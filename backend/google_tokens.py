@@ -0,0 +1,105 @@
+# backend/google_tokens.py
+
+import asyncio
+import os
+import re
+import time
+from typing import Dict, Optional
+from google.auth import jwt
+from http_clients import HTTPClientPool, http_pool
+from logging_config import logger
+
+GOOGLE_CERTS_URL = os.getenv('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v1/certs')
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+CERTS_DEFAULT_TTL = 3600     # seconds, when the response has no usable max-age
+CERTS_MIN_TTL = 60
+CERTS_REFRESH_MARGIN = 300   # refresh this long before the cached certs expire
+FORCED_REFRESH_INTERVAL = 30 # at most one refresh for an unknown key id per interval
+CLOCK_SKEW = 10              # seconds tolerated on iat/exp
+
+class InvalidGoogleToken(Exception):
+    pass
+
+def cache_max_age(cache_control: Optional[str]) -> int:
+    match = re.search(r'max-age=(\d+)', cache_control or '')
+    return max(int(match.group(1)), CERTS_MIN_TTL) if match else CERTS_DEFAULT_TTL
+
+class GoogleCertCache:
+    """
+    Google's ID-token signing certificates (key id -> PEM), kept in process.
+
+    A background task refreshes them shortly before the max-age Google sends expires, so
+    verification never waits on the network; a token signed with a key id we haven't
+    seen yet (Google rotates keys) triggers one rate-limited refresh.
+    """
+
+    def __init__(self, url: str = GOOGLE_CERTS_URL, pool: HTTPClientPool = http_pool):
+        self.url = url
+        self.pool = pool
+        self._certs: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._last_forced = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            response = await self.pool.get(self.url)
+            response.raise_for_status()
+            self._certs = response.json()
+            ttl = cache_max_age(response.headers.get('cache-control'))
+            self._expires_at = time.monotonic() + ttl
+            logger.info(f"Loaded {len(self._certs)} Google signing certs, valid for {ttl}s")
+
+    async def certs(self, key_id: Optional[str] = None) -> Dict[str, str]:
+        if time.monotonic() >= self._expires_at:
+            await self.refresh()
+        elif key_id and key_id not in self._certs and time.monotonic() - self._last_forced >= FORCED_REFRESH_INTERVAL:
+            self._last_forced = time.monotonic()
+            await self.refresh()
+        return self._certs
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(max(self._expires_at - time.monotonic() - CERTS_REFRESH_MARGIN, CERTS_MIN_TTL))
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Keep serving the cached certs; certs() refreshes on demand once they expire
+                logger.error(f"Refreshing Google certs failed: {e}")
+
+    async def start(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"Initial Google certs fetch failed, will retry on first login: {e}")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+google_certs = GoogleCertCache()
+
+async def verify_google_id_token(token: str, client_id: str, cache: GoogleCertCache = google_certs) -> dict:
+    """Verify a Google ID token's signature, expiry, audience and issuer locally; return its claims."""
+    try:
+        key_id = jwt.decode_header(token).get('kid')
+    except ValueError as e:
+        raise InvalidGoogleToken(f"Malformed token: {e}")
+    certs = await cache.certs(key_id)
+    try:
+        claims = jwt.decode(token, certs=certs, audience=client_id, clock_skew_in_seconds=CLOCK_SKEW)
+    except ValueError as e:
+        raise InvalidGoogleToken(str(e))
+    if claims.get('iss') not in GOOGLE_ISSUERS:
+        raise InvalidGoogleToken(f"Unexpected issuer: {claims.get('iss')}")
+    return claims
@@ -0,0 +1,162 @@
+# backend/http_clients.py
+
+import asyncio
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+import httpx
+from logging_config import logger
+
+DEFAULT_TIMEOUT = httpx.Timeout(float(os.getenv('HTTP_TIMEOUT', '10')), connect=5.0)
+DEFAULT_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=30.0)
+# Upstreams that get their own connection pool; anything else shares the default pool
+HOST_LIMITS = {
+    'oauth2.googleapis.com': httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=30.0),
+    'www.googleapis.com': httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=30.0),
+    'api.zarinpal.com': httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0),
+    'sandbox.zarinpal.com': httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0),
+}
+RETRY_STATUSES = {429, 502, 503, 504}
+RETRY_BACKOFF = 0.25       # seconds before the first retry, doubled each attempt
+RETRY_BACKOFF_MAX = 4.0
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('HTTP_BREAKER_FAILURES', '5'))
+BREAKER_RESET_TIMEOUT = float(os.getenv('HTTP_BREAKER_RESET', '30'))
+
+class CircuitOpenError(httpx.HTTPError):
+    """Raised without a network call while a host's breaker is open."""
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and fails fast for reset_timeout
+    seconds; then lets a single trial request through, closing again if it succeeds.
+    """
+
+    def __init__(self, host: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def before_request(self):
+        state = self.state
+        if state == 'open' or (state == 'half-open' and self._trial_in_flight):
+            raise CircuitOpenError(f"Circuit open for {self.host}")
+        if state == 'half-open':
+            self._trial_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Opening circuit for {self.host} after {self.failures} failures")
+            self.opened_at = time.monotonic()
+
+class HTTPClientPool:
+    """
+    Process-wide async HTTP clients: one keep-alive pool per upstream host in HOST_LIMITS
+    (so a slow Zarinpal can't use up Google's connections) plus a shared default pool,
+    with timeouts, retries with exponential backoff and a circuit breaker per host.
+    start()/close() run at application startup and shutdown.
+    """
+
+    def __init__(self, timeout: httpx.Timeout = DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    async def start(self):
+        for host, limits in HOST_LIMITS.items():
+            self._clients.setdefault(host, httpx.AsyncClient(timeout=self.timeout, limits=limits))
+        self._clients.setdefault('', httpx.AsyncClient(timeout=self.timeout, limits=DEFAULT_LIMITS))
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        await asyncio.gather(*(client.aclose() for client in clients.values()), return_exceptions=True)
+
+    def _client(self, host: str) -> httpx.AsyncClient:
+        key = host if host in HOST_LIMITS else ''
+        client = self._clients.get(key)
+        if client is None:
+            # Used outside the app lifespan (scripts, tests): create on demand
+            client = self._clients[key] = httpx.AsyncClient(timeout=self.timeout, limits=HOST_LIMITS.get(key, DEFAULT_LIMITS))
+        return client
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker(host)
+        return breaker
+
+    async def request(self, method: str, url: str, retries: Optional[int] = None, **kwargs) -> httpx.Response:
+        """
+        Send a request and return the final response. Connection errors, timeouts and
+        RETRY_STATUSES are retried `retries` times (default 2 for GET, 0 otherwise, since
+        repeating a POST is only safe when the caller knows it is idempotent). 5xx responses
+        and transport errors count against the host's breaker; other responses are returned
+        as they are for the caller to check.
+        """
+        host = urlsplit(url).hostname or ''
+        if retries is None:
+            retries = 2 if method.upper() == 'GET' else 0
+        client = self._client(host)
+        breaker = self.breaker(host)
+        for attempt in range(retries + 1):
+            breaker.before_request()
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                if attempt == retries:
+                    raise
+                logger.warning(f"{method} {host} failed ({e.__class__.__name__}), retry {attempt + 1}/{retries}")
+            else:
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if response.status_code not in RETRY_STATUSES or attempt == retries:
+                    return response
+                logger.warning(f"{method} {host} returned {response.status_code}, retry {attempt + 1}/{retries}")
+            await asyncio.sleep(min(RETRY_BACKOFF * 2 ** attempt, RETRY_BACKOFF_MAX) * random.uniform(0.5, 1.5))
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('POST', url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Streamed request (no retries: the body may be partly consumed) behind the host's breaker."""
+        host = urlsplit(url).hostname or ''
+        breaker = self.breaker(host)
+        breaker.before_request()
+        try:
+            async with self._client(host).stream(method, url, **kwargs) as response:
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                yield response
+        except httpx.TransportError:
+            breaker.record_failure()
+            raise
+
+http_pool = HTTPClientPool()
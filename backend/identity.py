@@ -0,0 +1,46 @@
+# backend/identity.py
+
+import json
+import os
+from typing import NamedTuple, Optional
+import redis
+from logging_config import logger
+
+IDENTITY_CACHE_TTL = int(os.getenv('IDENTITY_CACHE_TTL', '60'))  # seconds
+
+redis_client = redis.Redis(host='redis', port=6379, db=0)
+
+class Identity(NamedTuple):
+    """The few user fields most requests need, cheap enough to cache outside the database."""
+    id: int
+    email: str
+    is_admin: bool
+    remaining_time: float
+
+    @classmethod
+    def from_user(cls, user) -> "Identity":
+        return cls(user.id, user.email, bool(user.is_admin), user.remaining_time or 0.0)
+
+def _key(user_id: int) -> str:
+    return f"identity:{user_id}"
+
+def cached_identity(user_id: int) -> Optional[Identity]:
+    try:
+        data = redis_client.get(_key(user_id))
+    except redis.RedisError as e:
+        logger.warning(f"Identity cache unavailable: {e}")
+        return None
+    return Identity(*json.loads(data)) if data else None
+
+def cache_identity(identity: Identity):
+    try:
+        redis_client.set(_key(identity.id), json.dumps(identity), ex=IDENTITY_CACHE_TTL)
+    except redis.RedisError as e:
+        logger.warning(f"Identity cache unavailable: {e}")
+
+def invalidate_identity(user_id: int):
+    """Drop the cached identity; call after changing a user's balance or admin flag."""
+    try:
+        redis_client.delete(_key(user_id))
+    except redis.RedisError as e:
+        logger.warning(f"Could not invalidate identity for user {user_id}: {e}")
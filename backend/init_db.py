@@ -1,8 +1,43 @@
+from sqlalchemy import text
 from database import engine
 import models
 
+# create_all() only creates missing tables, so columns and indexes added to existing
+# tables are listed here and applied idempotently.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE uploaded_files ADD COLUMN IF NOT EXISTS media_info JSON",
+    "ALTER TABLE uploaded_files ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_uploaded_files_content_hash ON uploaded_files (content_hash)",
+    "ALTER TABLE uploaded_files ADD COLUMN IF NOT EXISTS transcript_data BYTEA",
+    "CREATE INDEX IF NOT EXISTS ix_uploaded_files_user_upload_time ON uploaded_files (user_id, upload_time, id)",
+    "CREATE INDEX IF NOT EXISTS ix_uploaded_files_user_status ON uploaded_files (user_id, status)",
+    "CREATE INDEX IF NOT EXISTS ix_user_activities_user_type_time ON user_activities (user_id, activity_type, timestamp)",
+    "ALTER TABLE uploaded_files ADD COLUMN IF NOT EXISTS source_url VARCHAR",
+    "ALTER TABLE uploaded_files ADD COLUMN IF NOT EXISTS destination_language VARCHAR",
+    "ALTER TABLE uploaded_files ADD COLUMN IF NOT EXISTS callback_url VARCHAR",
+    "ALTER TABLE uploaded_files ADD COLUMN IF NOT EXISTS external_upload_token VARCHAR",
+    "CREATE INDEX IF NOT EXISTS ix_uploaded_files_external_upload_token ON uploaded_files (external_upload_token)",
+    "ALTER TABLE uploaded_files ADD COLUMN IF NOT EXISTS callback_status VARCHAR",
+    "ALTER TABLE uploaded_files ADD COLUMN IF NOT EXISTS callback_attempts INTEGER DEFAULT 0",
+    "ALTER TABLE uploaded_files ADD COLUMN IF NOT EXISTS callback_error TEXT",
+    "ALTER TABLE uploaded_files ADD COLUMN IF NOT EXISTS callback_delivered_at TIMESTAMP",
+    "ALTER TABLE uploaded_files ADD COLUMN IF NOT EXISTS timeline JSON",
+    "ALTER TABLE uploaded_files ADD COLUMN IF NOT EXISTS finished_at TIMESTAMP",
+    "CREATE INDEX IF NOT EXISTS ix_uploaded_files_finished_at ON uploaded_files (finished_at)",
+    # Trigram indexes let the admin user search's ILIKE '%term%' skip the sequential scan
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_email_trgm ON users USING gin (email gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_name_trgm ON users USING gin (name gin_trgm_ops)",
+]
+
+def upgrade_schema():
+    with engine.begin() as connection:
+        for statement in SCHEMA_UPGRADES:
+            connection.execute(text(statement))
+
 def init_db():
     models.Base.metadata.create_all(bind=engine)  # Creates tables if they don't exist
+    upgrade_schema()
 
 if __name__ == '__main__':
     init_db()
@@ -1,33 +1,51 @@
 # backend/main.py
 from datetime import datetime, timezone
 import os
+import json
 import uuid
-from sqlalchemy import text
+import hashlib
+import base64
+from sqlalchemy import text, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from fastapi import FastAPI, Request, Depends, HTTPException, status, UploadFile, File, Form, Query, APIRouter, Header
-import requests
-from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse
+import httpx
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only
 import models
 from starlette.middleware.sessions import SessionMiddleware
 import time
 from pydantic import BaseModel, Field
-from database import engine, get_db
-from models import User, UploadedFile, UserActivity
+from database import engine, async_engine, get_db, get_async_db, SessionLocal
+from models import User, UploadedFile, UserActivity, TranscriptExport
+from transcript import Transcript
+from renderers import convert_transcription_to_format
+from subtitles import PROFILES, get_profile
 import tasks
-from tasks import get_media_duration
+import metrics
+from celery_config import celery_app
+import summaries
+import events
+from media import media_prober
+from http_clients import http_pool
+from google_tokens import google_certs, verify_google_id_token, InvalidGoogleToken
+from sse import sse_broker, SSEConnectionLimit, SSE_KEEPALIVE_INTERVAL
+from init_db import upgrade_schema
+from user_stats import record_login, forget_file
 from admin_routes import admin_router
-from dependencies import get_current_user
+from dependencies import get_current_user, get_current_user_async, get_current_identity
+from identity import invalidate_identity
+from scheduling import SERVICE_USER_EMAIL
 from payment_routes import payment_router
 from logging_config import logger
-import redis.asyncio as aioredis
 import asyncio
 import redis
-from openai import OpenAI
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from urllib.parse import urlparse
-from typing import Optional
+from urllib.parse import urlparse, quote
+from typing import Optional, Tuple
 
 SESSION_COOKIE_SAMESITE = os.getenv('SESSION_COOKIE_SAMESITE', 'lax')
 SESSION_COOKIE_HTTPS_ONLY = os.getenv('SESSION_COOKIE_HTTPS_ONLY', 'false').lower() == 'true'
@@ -68,6 +86,7 @@ UPLOAD_DIRECTORY = "/app/uploads"
 os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
 
 models.Base.metadata.create_all(bind=engine)
+upgrade_schema()
 
 redis_client = redis.Redis(host='redis', port=6379, db=0)
 
@@ -83,20 +102,25 @@ app.state.limiter = limiter
 
 @app.middleware("http")
 async def selective_perf_log(request: Request, call_next):
-    start_time = time.time()
+    start_time = time.perf_counter()
+    db_stats = metrics.start_request_db_stats()
     response = await call_next(request)
-    process_time = time.time() - start_time
+    process_time = time.perf_counter() - start_time
     method = request.method
     path = request.url.path
 
+    # Label by route template (/files/{file_id}), not the raw path, to keep series bounded
+    route = request.scope.get('route')
+    route_path = getattr(route, 'path', 'unmatched')
+    metrics.REQUEST_LATENCY.labels(method, route_path, str(response.status_code)).observe(process_time)
+    metrics.REQUEST_DB_QUERIES.labels(route_path).observe(db_stats[0])
+    metrics.REQUEST_DB_SECONDS.labels(route_path).observe(db_stats[1])
+
     if (method, path) in IMPORTANT_ENDPOINTS:
-        user_id = request.session.get('user_id')
-        user_email = "unknown"
-        if user_id:
-            db = next(get_db())
-            user = db.query(User).filter(User.id == user_id).first()
-            if user:
-                user_email = user.email
+        # Usually already resolved by the endpoint; otherwise served from the identity cache
+        identity = await get_current_identity(request)
+        user_id = identity.id if identity else None
+        user_email = identity.email if identity else "unknown"
         logger.info(f"[PERF] {method} {path} took {process_time:.3f} sec (user_id={user_id}, user_email={user_email})")
     return response
 
@@ -106,7 +130,7 @@ class GoogleAuthToken(BaseModel):
 
 if os.getenv('APP_ENV') == 'development':
     @app.post("/auth/dev-login")
-    async def dev_login(request: Request, email: str = Form(...), db: Session = Depends(get_db)):
+    def dev_login(request: Request, email: str = Form(...), db: Session = Depends(get_db)):
         user = db.query(User).filter(User.email == email).first()
         if not user:
             logger.error(f"Dev login failed: User with email {email} not found")
@@ -121,6 +145,7 @@ if os.getenv('APP_ENV') == 'development':
             timestamp=datetime.utcnow()
         )
         db.add(activity)
+        record_login(user)
         db.commit()
         
         logger.info(f"Dev login successful for user: {email} (ID: {user.id})")
@@ -138,15 +163,11 @@ async def auth_google(token: GoogleAuthToken, request: Request, db: Session = De
         if not client_id:
             logger.error("GOOGLE_CLIENT_ID is not set.")
             raise HTTPException(status_code=500, detail="Server configuration error.")
-        verify_url = f"https://oauth2.googleapis.com/tokeninfo?id_token={id_token_str}"
-        response = requests.get(verify_url)
-        if response.status_code != 200:
-            logger.error(f"Failed to verify ID token: {response.text}")
+        try:
+            claims = await verify_google_id_token(id_token_str, client_id)
+        except InvalidGoogleToken as e:
+            logger.error(f"Failed to verify ID token: {e}")
             raise HTTPException(status_code=400, detail="Invalid ID token.")
-        claims = response.json()
-        if claims.get('aud') != client_id or claims.get('iss') not in ['accounts.google.com', 'https://accounts.google.com']:
-            logger.error("Invalid token audience or issuer.")
-            raise HTTPException(status_code=400, detail="Invalid token.")
         email = claims.get('email')
         name = claims.get('name')
         picture = claims.get('picture')
@@ -166,17 +187,24 @@ async def auth_google(token: GoogleAuthToken, request: Request, db: Session = De
         logger.info(f"User ID {user.id} stored in session.")
         activity = UserActivity(user_id=user.id, activity_type='login', details='User logged in via Google OAuth')
         db.add(activity)
+        record_login(user)
         db.commit()
         if not next_url.startswith('/'):
             logger.warning(f"Invalid next_url: {next_url}. Using /dashboard.")
             next_url = '/dashboard'
         return JSONResponse(content={"detail": "Authenticated successfully", "next_url": next_url})
+    except HTTPException:
+        raise
+    except httpx.HTTPError as e:
+        # Only reached when Google's signing certs can't be fetched
+        logger.error(f"Google token verification unavailable: {e}")
+        raise HTTPException(status_code=503, detail="Sign-in is temporarily unavailable. Please try again.")
     except Exception as e:
         logger.exception(f"Google auth error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error.")
 
 @app.post("/logout")
-async def logout(request: Request, db: Session = Depends(get_db)):
+def logout(request: Request, db: Session = Depends(get_db)):
     user_id = request.session.get('user_id')
     if user_id:
         activity = UserActivity(user_id=user_id, activity_type='logout', details='User logged out')
@@ -193,20 +221,60 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"detail": "Internal server error. Please try again later."}
     )
 
+@app.on_event("startup")
+async def start_http_pool():
+    await http_pool.start()
+
+@app.on_event("shutdown")
+async def close_http_pool():
+    await http_pool.close()
+
+@app.on_event("startup")
+async def start_google_certs():
+    await google_certs.start()
+
+@app.on_event("shutdown")
+async def stop_google_certs():
+    await google_certs.stop()
+
+@app.on_event("startup")
+async def start_sse_broker():
+    await sse_broker.start()
+
+@app.on_event("shutdown")
+async def stop_sse_broker():
+    await sse_broker.stop()
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+
+@app.on_event("shutdown")
+def shutdown_media_prober():
+    media_prober.shutdown()
+
+queue_depth_collector = metrics.QueueDepthCollector(redis_client, [queue.name for queue in celery_app.conf.task_queues])
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus scrape target, reached inside the compose network (nginx doesn't proxy it)."""
+    return Response(content=metrics.render(queue_depth_collector), media_type=metrics.CONTENT_TYPE_LATEST)
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
 
 @app.get("/me")
-async def read_me(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+async def read_me(request: Request, db: AsyncSession = Depends(get_async_db)):
+    user = await get_current_user_async(request, db)
     if not user:
         return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"detail": "Not authenticated"})
     current_time = datetime.utcnow()
     if user.expiration_date and current_time > user.expiration_date:
         user.remaining_time = 0
-        db.commit()
+        await db.commit()
+        invalidate_identity(user.id)
     return {
         "id": user.id,
         "email": user.email,
@@ -221,14 +289,43 @@ async def read_me(request: Request, db: Session = Depends(get_db)):
 async def read_root():
     return {"message": "Welcome to Captioni Backend!"}
 
-async def save_upload_file(upload_file: UploadFile, content: bytes) -> str:
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB per read while streaming uploads to disk
+MAX_FILE_SIZE = 250 * 1024 * 1024
+
+class UploadTooLarge(Exception):
+    pass
+
+async def save_upload_file(upload_file: UploadFile, max_size: int = MAX_FILE_SIZE) -> Tuple[str, str]:
+    """
+    Stream an upload to disk in fixed-size chunks and return (final path, sha256 hex).
+    Data goes to a temporary ".part" file inside UPLOAD_DIRECTORY, the size limit is
+    enforced as bytes arrive, and the file is renamed into place only once complete,
+    so memory use stays constant and no partial file is ever visible.
+    """
     import aiofiles
+    digest = hashlib.sha256()
     file_extension = upload_file.filename.split(".")[-1].lower()
     file_name = f"{uuid.uuid4()}.{file_extension}"
     file_location = os.path.join(UPLOAD_DIRECTORY, file_name)
-    async with aiofiles.open(file_location, 'wb') as out_file:
-        await out_file.write(content)
-    return file_location
+    temp_location = f"{file_location}.part"
+    written = 0
+    try:
+        async with aiofiles.open(temp_location, 'wb') as out_file:
+            while True:
+                chunk = await upload_file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_size:
+                    raise UploadTooLarge(f"Upload exceeds {max_size} bytes")
+                digest.update(chunk)
+                await out_file.write(chunk)
+        os.replace(temp_location, file_location)
+    except BaseException:
+        if os.path.exists(temp_location):
+            os.remove(temp_location)
+        raise
+    return file_location, digest.hexdigest()
 
 ALLOWED_AUDIO_EXTENSIONS = ["wav", "mp3", "m4a", "flac", "aac", "ogg"]
 ALLOWED_VIDEO_EXTENSIONS = ["mp4", "avi", "mkv", "mov", "wmv", "webm", "flv", "mpg", "mpeg"]
@@ -243,6 +340,7 @@ async def upload_file(
     language: str = Form('fa'),
     tag_audio_events: bool = Form(False),
     diarize: bool = Form(False),
+    subtitle_profile: str = Form('default'),
     db: Session = Depends(get_db)
 ):
     try:
@@ -254,14 +352,19 @@ async def upload_file(
         if file_extension not in ALLOWED_EXTENSIONS:
             logger.error(f"Unsupported file type by user {user.email}: {file.filename}")
             raise HTTPException(status_code=400, detail="Unsupported file type")
+        if subtitle_profile not in PROFILES:
+            raise HTTPException(status_code=400, detail="Unknown subtitle profile")
         is_video = file_extension in ALLOWED_VIDEO_EXTENSIONS
-        MAX_FILE_SIZE = 250 * 1024 * 1024
-        content = await file.read()
-        if len(content) > MAX_FILE_SIZE:
+        if file.size is not None and file.size > MAX_FILE_SIZE:
             logger.error(f"File too large by user {user.email}: {file.filename}")
             raise HTTPException(status_code=400, detail="File size exceeds limit")
-        file_location = await save_upload_file(file, content)
-        media_duration = get_media_duration(file_location)
+        try:
+            file_location, content_hash = await save_upload_file(file)
+        except UploadTooLarge:
+            logger.error(f"File too large by user {user.email}: {file.filename}")
+            raise HTTPException(status_code=400, detail="File size exceeds limit")
+        media_info = await media_prober.probe(file_location)
+        media_duration = media_info["duration"] if media_info else 0
         if media_duration <= 0:
             if os.path.exists(file_location):
                 os.remove(file_location)
@@ -271,6 +374,7 @@ async def upload_file(
         if user.expiration_date_aware and datetime.now(timezone.utc) > user.expiration_date_aware:
             user.remaining_time = 0
             db.commit()
+            invalidate_identity(user.id)
         if user.remaining_time <= 0 or user.remaining_time < media_duration_minutes:
             if os.path.exists(file_location):
                 os.remove(file_location)
@@ -278,46 +382,36 @@ async def upload_file(
             return JSONResponse(status_code=400, content={"detail": "Insufficient transcription time. Please buy more time."})
         uploaded_file = UploadedFile(
             user_id=user.id, filename=file.filename, filepath=file_location, upload_time=datetime.now(timezone.utc),
-            status='pending', output_format=output_format, language=language, media_duration=media_duration, is_video=is_video
+            status='pending', output_format=output_format, language=language, media_duration=media_duration, is_video=is_video,
+            media_info=media_info, content_hash=content_hash
         )
         db.add(uploaded_file)
         db.commit()
         db.refresh(uploaded_file)
+        invalidate_file_count(user.id)
         logger.info(f"User {user.email} uploaded file {file.filename} (id={uploaded_file.id}) for transcription.")
-        tasks.transcribe_file.delay(uploaded_file.id, output_format, language, tag_audio_events, diarize)
+        tasks.enqueue_transcription(uploaded_file, output_format, language, tag_audio_events, diarize, subtitle_profile=subtitle_profile)
         return JSONResponse(status_code=200, content={"detail": "File uploaded successfully", "file_id": uploaded_file.id})
+    except HTTPException:
+        if 'file_location' in locals() and os.path.exists(file_location):
+            os.remove(file_location)
+        raise
     except Exception as e:
         logger.exception(f"Upload error: {e}")
         if 'file_location' in locals() and os.path.exists(file_location):
             os.remove(file_location)
         raise HTTPException(status_code=500, detail="An error occurred while uploading the file. Please try again.")
 
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-
-def generate_summary(text):
-    response = client.chat.completions.create(
-        model="gpt-5-mini",
-        messages=[
-            {
-                "role": "system",
-                "content": "You are an expert summarizer and keyword extractor. Your tasks are:\n1. To provide a concise, coherent summary of the input text.\n2. To extract a list of the most important keywords or key phrases that capture the main ideas.\n\nImportant instructions:\n- The summary should not exceed 200 words.\n- The summary should be written in the same language as the input text.\n- The list of keywords must also be in the same language and, if possible, reflect phrases exactly as they appear in the text.\n- Focus on preserving the meaning and the key details without adding any extra information."
-            },
-            {
-                "role": "user",
-                "content": f"input Text:\n\"\"\"\n{text}\n\"\"\""
-            }
-        ],
-    max_completion_tokens=350,
-
-    )
-    return response.choices[0].message.content.strip()
-
 @app.post("/files/{file_id}/summarize")
 @limiter.limit("5/minute")
-async def summarize_file(file_id: int,
-                         request: Request,
-                         db: Session = Depends(get_db),
-                         current_user=Depends(get_current_user)):
+def summarize_file(file_id: int,
+                   request: Request,
+                   db: Session = Depends(get_db),
+                   current_user=Depends(get_current_user)):
+    """
+    Return the summary if it exists or is cached for this transcript; otherwise queue
+    tasks.summarize_file and answer 202. The summary then arrives as an SSE event.
+    """
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     file = db.query(UploadedFile).filter(UploadedFile.id == file_id, UploadedFile.user_id == current_user.id).first()
@@ -327,38 +421,228 @@ async def summarize_file(file_id: int,
         raise HTTPException(status_code=400, detail="File is not transcribed yet")
     if file.summary:
         return {"summary": file.summary}
-    try:
-        summary = generate_summary(file.transcription)
+    summary = summaries.cached_summary(file.transcription)
+    if summary:
         file.summary = summary
         db.commit()
-        logger.info(f"Summary generated for file_id={file_id} by user_id={current_user.id}")
         return {"summary": summary}
+    try:
+        if redis_client.set(tasks.summary_pending_key(file_id), 1, nx=True, ex=tasks.SUMMARY_PENDING_TTL):
+            tasks.summarize_file.delay(file_id)
+            logger.info(f"Summary requested for file_id={file_id} by user_id={current_user.id}")
     except Exception as e:
-        logger.error(f"Error generating summary for file_id={file_id}: {e}")
+        logger.error(f"Error queueing summary for file_id={file_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate summary")
+    return JSONResponse(status_code=202, content={"status": "pending"})
     
+FILE_COUNT_CACHE_TTL = 300  # seconds; the total is a hint for the pager, not an exact figure
+TRANSCRIPTION_STREAM_THRESHOLD = 256 * 1024  # characters
+TRANSCRIPTION_STREAM_CHUNK = 64 * 1024
+
+# Everything the dashboard shows except the transcription and summary texts
+FILE_LIST_COLUMNS = (
+    UploadedFile.id, UploadedFile.user_id, UploadedFile.filename, UploadedFile.filepath, UploadedFile.upload_time,
+    UploadedFile.status, UploadedFile.transcription_job_id, UploadedFile.output_format, UploadedFile.language,
+    UploadedFile.media_duration,
+)
+
+def file_count_key(user_id: int) -> str:
+    return f"files_total:{user_id}"
+
+def invalidate_file_count(user_id: int):
+    try:
+        redis_client.delete(file_count_key(user_id))
+    except redis.RedisError as e:
+        logger.warning(f"Could not invalidate file count for user {user_id}: {e}")
+
+async def cached_file_count(db: AsyncSession, user_id: int) -> int:
+    key = file_count_key(user_id)
+    try:
+        cached = redis_client.get(key)
+        if cached is not None:
+            return int(cached)
+    except redis.RedisError as e:
+        logger.warning(f"File count cache unavailable: {e}")
+    total = await db.scalar(select(func.count(UploadedFile.id)).where(UploadedFile.user_id == user_id))
+    try:
+        redis_client.set(key, total, ex=FILE_COUNT_CACHE_TTL)
+    except redis.RedisError:
+        pass
+    return total
+
+def encode_file_cursor(file: UploadedFile) -> str:
+    raw = f"{file.upload_time.isoformat()}|{file.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_file_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        upload_time, file_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit('|', 1)
+        return datetime.fromisoformat(upload_time), int(file_id)
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @app.get("/files")
-async def get_user_files(request: Request, db: Session = Depends(get_db), limit: int = Query(10, ge=1, le=100), offset: int = Query(0, ge=0)):
-    user = get_current_user(request, db)
+async def get_user_files(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    view: str = Query('full', pattern='^(full|slim)$'),
+    cursor: Optional[str] = Query(None),
+    include_total: Optional[bool] = Query(None),
+):
+    """
+    List the user's files, newest first.
+
+    view=slim skips the transcription and summary texts (fetch them per file from
+    /files/{id}/transcription) and pages with an opaque cursor on (upload_time, id)
+    instead of OFFSET. The total is cached per user and only computed on request,
+    which is the default for the full view.
+    """
+    user = await get_current_identity(request)
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    query = db.query(UploadedFile).filter(UploadedFile.user_id == user.id)
-    total = query.count()
-    files = query.order_by(UploadedFile.upload_time.desc()).limit(limit).offset(offset).all()
-    return {
-        "total": total,
+    slim = view == 'slim'
+    if include_total is None:
+        include_total = not slim
+    query = select(UploadedFile).where(UploadedFile.user_id == user.id)
+    if slim:
+        query = query.options(load_only(*FILE_LIST_COLUMNS))
+    if cursor:
+        upload_time, file_id = decode_file_cursor(cursor)
+        query = query.where(tuple_(UploadedFile.upload_time, UploadedFile.id) < tuple_(upload_time, file_id))
+    query = query.order_by(UploadedFile.upload_time.desc(), UploadedFile.id.desc())
+    if cursor or slim:
+        # Fetch one extra row to learn whether another page exists
+        query = query.limit(limit + 1)
+    else:
+        query = query.limit(limit).offset(offset)
+    files = (await db.scalars(query)).all()
+    next_cursor = None
+    if len(files) > limit:
+        files = files[:limit]
+        next_cursor = encode_file_cursor(files[-1])
+    result = {
         "files": [
             {
                 "id": f.id, "user_id": f.user_id, "filename": f.filename, "filepath": f.filepath,
-                "upload_time": f.upload_time.isoformat(), "status": f.status, "transcription": f.transcription,
+                "upload_time": f.upload_time.isoformat(), "status": f.status,
                 "transcription_job_id": f.transcription_job_id, "output_format": f.output_format,
-                "language": f.language, "media_duration": f.media_duration, "summary": f.summary
+                "language": f.language, "media_duration": f.media_duration,
+                **({} if slim else {"transcription": f.transcription, "summary": f.summary}),
             } for f in files
-        ]
+        ],
+        "next_cursor": next_cursor,
     }
+    if include_total:
+        result["total"] = await cached_file_count(db, user.id)
+    return result
+
+def iter_transcription(file_id: int, length: int, chunk_size: int = TRANSCRIPTION_STREAM_CHUNK):
+    """Read a transcription from the database in substr() slices so it's never held whole."""
+    db = SessionLocal()
+    try:
+        for position in range(1, length + 1, chunk_size):
+            yield db.query(func.substr(UploadedFile.transcription, position, chunk_size)).filter(UploadedFile.id == file_id).scalar() or ""
+    finally:
+        db.close()
+
+@app.get("/files/{file_id}/transcription")
+async def get_file_transcription(file_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    user = await get_current_identity(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    row = (await db.execute(
+        select(UploadedFile.output_format, func.length(UploadedFile.transcription))
+        .where(UploadedFile.id == file_id, UploadedFile.user_id == user.id)
+    )).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="File not found")
+    output_format, length = row
+    if length is None:
+        raise HTTPException(status_code=404, detail="File has no transcription yet")
+    media_type = EXPORT_MEDIA_TYPES.get(output_format, EXPORT_MEDIA_TYPES['txt'])
+    if length <= TRANSCRIPTION_STREAM_THRESHOLD:
+        text_content = await db.scalar(select(UploadedFile.transcription).where(UploadedFile.id == file_id))
+        return Response(content=text_content, media_type=media_type)
+    return StreamingResponse(iter_transcription(file_id, length), media_type=media_type)
+
+EXPORT_MEDIA_TYPES = {
+    "txt": "text/plain; charset=utf-8",
+    "srt": "application/x-subrip; charset=utf-8",
+    "vtt": "text/vtt; charset=utf-8",
+    "json": "application/json",
+}
+
+@app.get("/files/{file_id}/export")
+async def export_file(
+    file_id: int,
+    request: Request,
+    format: str = Query('txt'),
+    profile: str = Query('default'),
+    max_chars_per_line: Optional[int] = Query(None, ge=10, le=200),
+    max_lines: Optional[int] = Query(None, ge=1, le=4),
+    max_chars_per_second: Optional[float] = Query(None, gt=0, le=60),
+    db: AsyncSession = Depends(get_async_db)
+):
+    user = await get_current_identity(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Unsupported export format")
+    try:
+        subtitle_profile = get_profile(
+            profile, max_chars_per_line=max_chars_per_line, max_lines=max_lines, max_chars_per_second=max_chars_per_second
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Unknown subtitle profile")
+    customized = subtitle_profile != PROFILES[profile]
+    key = tasks.export_key(format, profile)
+    file = await db.scalar(select(UploadedFile).where(UploadedFile.id == file_id, UploadedFile.user_id == user.id))
+    if not file:
+        raise HTTPException(status_code=404, detail="File not found")
+    if file.status != 'transcribed':
+        raise HTTPException(status_code=400, detail="File is not transcribed yet")
+    # Read before any rollback below, which would expire the loaded row
+    download_name = f"{os.path.splitext(file.filename or str(file.id))[0]}.{format}"
+
+    export = None
+    if not customized:
+        export = await db.scalar(
+            select(TranscriptExport).where(TranscriptExport.uploaded_file_id == file.id, TranscriptExport.format == key)
+        )
+    if export:
+        content = export.content
+    else:
+        # transcript_data is deferred; async sessions can't lazy-load it, so select it explicitly
+        transcript_data = await db.scalar(select(UploadedFile.transcript_data).where(UploadedFile.id == file.id))
+        if transcript_data is None:
+            # Files from before exports were rendered with the default profile and keep only
+            # their upload-time output, which can serve an unmodified default export
+            if customized or key != file.output_format or file.transcription is None:
+                raise HTTPException(status_code=409, detail="This file was transcribed before exports were available")
+            content = file.transcription
+        else:
+            transcript = await run_in_threadpool(Transcript.unpack, transcript_data)
+            content = await run_in_threadpool(convert_transcription_to_format, transcript, format, subtitle_profile)
+            # One-off line-length/reading-speed overrides are rendered but not cached
+            if not customized:
+                db.add(TranscriptExport(uploaded_file_id=file.id, format=key, content=content))
+                try:
+                    await db.commit()
+                except IntegrityError:
+                    # A concurrent request rendered the same export first
+                    await db.rollback()
+            logger.info(f"Rendered {key} export for file_id={file_id}, user_id={user.id}")
+
+    return Response(
+        content=content,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(download_name)}"}
+    )
 
 @app.delete("/files/{file_id}")
-async def delete_file(file_id: int, request: Request, db: Session = Depends(get_db)):
+def delete_file(file_id: int, request: Request, db: Session = Depends(get_db)):
     user = get_current_user(request, db)
     if not user:
         logger.warning("Unauthorized file deletion attempt.")
@@ -369,44 +653,74 @@ async def delete_file(file_id: int, request: Request, db: Session = Depends(get_
         raise HTTPException(status_code=404, detail="File not found")
     if os.path.exists(file.filepath):
         os.remove(file.filepath)
+    forget_file(db, file)
     db.delete(file)
     db.commit()
+    invalidate_file_count(user.id)
     logger.info(f"User {user.email} deleted file id {file_id}")
     return {"detail": "File deleted"}
 
 @app.get("/api/sse")
-async def sse_endpoint(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+async def sse_endpoint(request: Request):
+    user = await get_current_identity(request)
     if not user:
         return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
     
-    user_channel = f"user_{user.id}_updates"
+    user_channel = events.user_channel(user.id)
+    # EventSource resends the last id it saw on automatic reconnects; the query parameter
+    # covers connections the page reopens itself
+    last_event_id = request.headers.get("last-event-id") or request.query_params.get("last_event_id")
+    if not events.parse_event_id(last_event_id):
+        last_event_id = None
+    try:
+        # Subscribe before reading the backlog so nothing published in between is lost
+        queue = await sse_broker.subscribe(user_channel)
+    except SSEConnectionLimit:
+        logger.warning(f"Rejecting SSE connection for user {user.email}: {sse_broker.connections} open")
+        return JSONResponse(status_code=503, content={"detail": "Too many live connections, retry shortly"}, headers={"Retry-After": "5"})
     
     async def event_generator():
-        redis_conn = await aioredis.from_url("redis://redis:6379")
-        pubsub = redis_conn.pubsub()
-        await pubsub.subscribe(user_channel)
-        last_keepalive = time.time()
-        
+        delivered = events.parse_event_id(last_event_id)
         try:
+            stream = events.user_stream(user.id)
+            try:
+                if last_event_id:
+                    backlog, complete = await sse_broker.replay(stream, last_event_id)
+                    if not complete:
+                        # Part of what the client missed has been trimmed: tell it to reload
+                        yield f"data: {json.dumps({'resync': True})}\n\n"
+                    for event_id, data in backlog:
+                        yield f"id: {event_id}\ndata: {data}\n\n"
+                        delivered = events.parse_event_id(event_id)
+                else:
+                    # An id-only event sets the client's resume point without delivering anything
+                    latest = await sse_broker.latest_event_id(stream)
+                    if latest:
+                        yield f"id: {latest}\n\n"
+                        delivered = events.parse_event_id(latest)
+            except Exception as e:
+                logger.error(f"SSE replay failed for user {user.email}: {str(e)}")
             while True:
-                if await request.is_disconnected():
-                    break
-                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
-                if message and message['type'] == 'message':
-                    data = message['data'].decode('utf-8')
-                    yield f"data: {data}\n\n"
-                
-                if time.time() - last_keepalive >= 15:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
                     yield ": keepalive\n\n"
-                    last_keepalive = time.time()
-                await asyncio.sleep(1)
+                    continue
+                event_id, data = events.unpack_message(message)
+                if event_id is None:
+                    yield f"data: {data}\n\n"
+                    continue
+                parsed = events.parse_event_id(event_id)
+                if delivered and parsed and parsed <= delivered:
+                    continue  # already sent from the backlog
+                delivered = parsed
+                yield f"id: {event_id}\ndata: {data}\n\n"
         except Exception as e:
             logger.error(f"SSE error for user {user.email}: {str(e)}")
         finally:
+            # Runs on client disconnect too: Starlette cancels the stream when the client goes away
             logger.debug(f"SSE connection closed for user {user.email}")
-            await pubsub.unsubscribe(user_channel)
-            await redis_conn.close()
+            sse_broker.unsubscribe(user_channel, queue)
     
     return StreamingResponse(
         event_generator(),
@@ -414,8 +728,6 @@ async def sse_endpoint(request: Request, db: Session = Depends(get_db)):
         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
-SERVICE_USER_EMAIL = "transcription_service@tootty.com"
-
 # MODIFIED: Added destination_language
 class TranscriptionRequest(BaseModel):
     audio_url: str
@@ -423,16 +735,24 @@ class TranscriptionRequest(BaseModel):
     upload_token: str
     language: str
     destination_language: Optional[str] = None
+    checksum: Optional[str] = None  # hex sha256 of the audio, verified after download
 
-@app.post("/api/transcribe")
-async def transcribe(
+@app.post("/api/transcribe", status_code=202)
+def transcribe(
     request: TranscriptionRequest,
     api_key: str = Header(None, alias="X-API-Key"),
     download_api_key: str = Header(None, alias="X-Download-API-Key"),
     db: Session = Depends(get_db)
 ):
+    """
+    Accept a service-API job and return at once: the audio is downloaded by the
+    ingest_remote_audio task (resumable, size-capped, checksummed), which then hands
+    over to transcribe_file.
+    """
     if api_key != os.getenv("TRANSCRIPTION_API_KEY"):
         raise HTTPException(status_code=403, detail="Invalid API key")
+    if urlparse(request.audio_url).scheme not in ("http", "https"):
+        raise HTTPException(status_code=400, detail="audio_url must be an http(s) URL")
 
     service_user = db.query(User).filter(User.email == SERVICE_USER_EMAIL).first()
     if not service_user:
@@ -444,44 +764,17 @@ async def transcribe(
         db.commit()
         db.refresh(service_user)
 
-    try:
-        logger.info(f"Downloading audio from URL: {request.audio_url}")
-        headers = {"X-Download-API-Key": download_api_key}
-        with requests.get(request.audio_url, headers=headers, stream=True, timeout=300) as r:
-            r.raise_for_status()
-            
-            original_filename = "downloaded_audio.mp3"
-            parsed_url = urlparse(request.audio_url)
-
-            if parsed_url.path:
-                basename = os.path.basename(parsed_url.path)
-                if basename:
-                     original_filename = basename
-
-            filename = f"{request.upload_token}.mp3"
-            file_location = os.path.join(UPLOAD_DIRECTORY, filename)
-            
-            with open(file_location, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
-        logger.info(f"Successfully downloaded audio to {file_location}")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to download audio from {request.audio_url}: {e}")
-        raise HTTPException(status_code=400, detail=f"Could not download audio file from provided URL. Error: {e}")
-    except IOError as e:
-        logger.error(f"Failed to write downloaded file to disk: {e}")
-        raise HTTPException(status_code=500, detail=f"Could not save downloaded audio file. Error: {e}")
-
-    # MODIFIED: Save destination_language
+    original_filename = os.path.basename(urlparse(request.audio_url).path) or "downloaded_audio.mp3"
     uploaded_file = UploadedFile(
         user_id=service_user.id,
         filename=original_filename,
-        filepath=file_location,
+        filepath=os.path.join(UPLOAD_DIRECTORY, f"{request.upload_token}.mp3"),
         upload_time=datetime.now(timezone.utc),
-        status='pending',
+        status='downloading',
         output_format='json',
         language=request.language,
-        destination_language=request.destination_language, # ADDED
+        source_url=request.audio_url,
+        destination_language=request.destination_language,
         callback_url=request.callback_url,
         external_upload_token=request.upload_token,
         is_video=False
@@ -489,12 +782,13 @@ async def transcribe(
     db.add(uploaded_file)
     db.commit()
     db.refresh(uploaded_file)
+    invalidate_file_count(uploaded_file.user_id)
 
-    tasks.transcribe_file.delay(uploaded_file.id, 'json', request.language, False, True)
-    return {"file_id": uploaded_file.id}
+    tasks.enqueue_remote_transcription(uploaded_file.id, request.audio_url, download_api_key, request.checksum, request.language)
+    return {"file_id": uploaded_file.id, "status": uploaded_file.status}
 
 @app.post("/api/cleanup-file/{upload_token}")
-async def cleanup_file(
+def cleanup_file(
     upload_token: str,
     api_key: str = Header(None, alias="X-API-Key"),
     db: Session = Depends(get_db)
@@ -543,9 +837,14 @@ async def google_callback(request: Request, code: str = Query(None), db: Session
     client_id = os.getenv('GOOGLE_CLIENT_ID')
     client_secret = os.getenv('GOOGLE_CLIENT_SECRET')
     redirect_uri = f"{os.getenv('BASE_URL')}/auth/google/callback"
-    token_res = requests.post("https://oauth2.googleapis.com/token", data={
-        "code": code, "client_id": client_id, "client_secret": client_secret, "redirect_uri": redirect_uri, "grant_type": "authorization_code"
-    })
+    try:
+        # An authorization code is single-use, so the exchange is not retried
+        token_res = await http_pool.post("https://oauth2.googleapis.com/token", data={
+            "code": code, "client_id": client_id, "client_secret": client_secret, "redirect_uri": redirect_uri, "grant_type": "authorization_code"
+        })
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to reach Google token endpoint: {e}")
+        return RedirectResponse(url="/?error=token_exchange_failed")
     if token_res.status_code != 200:
         logger.error(f"Failed to exchange code: {token_res.text}")
         return RedirectResponse(url="/?error=token_exchange_failed")
@@ -554,14 +853,11 @@ async def google_callback(request: Request, code: str = Query(None), db: Session
     if not id_token:
         logger.error("No id_token in response.")
         return RedirectResponse(url="/?error=no_id_token")
-    response = requests.get(f"https://oauth2.googleapis.com/tokeninfo?id_token={id_token}")
-    if response.status_code != 200:
-        logger.error(f"Failed to verify ID token: {response.text}")
+    try:
+        claims = await verify_google_id_token(id_token, client_id)
+    except (InvalidGoogleToken, httpx.HTTPError) as e:
+        logger.error(f"Failed to verify ID token: {e}")
         return RedirectResponse(url="/?error=invalid_id_token")
-    claims = response.json()
-    if claims.get('aud') != client_id or claims.get('iss') not in ['accounts.google.com', 'https://accounts.google.com']:
-        logger.error("Invalid token audience or issuer.")
-        return RedirectResponse(url="/?error=invalid_token")
     email = claims.get('email')
     name = claims.get('name')
     picture = claims.get('picture')
@@ -581,5 +877,6 @@ async def google_callback(request: Request, code: str = Query(None), db: Session
     logger.info(f"User ID {user.id} stored in session.")
     activity = UserActivity(user_id=user.id, activity_type='login', details='User logged in via Google OAuth (Redirect Flow)')
     db.add(activity)
+    record_login(user)
     db.commit()
     return RedirectResponse(url="/dashboard")
@@ -0,0 +1,235 @@
+# backend/media.py
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+from logging_config import logger
+
+PROBE_MAX_CONCURRENCY = int(os.getenv('PROBE_MAX_CONCURRENCY', '4'))
+PROBE_TIMEOUT = float(os.getenv('PROBE_TIMEOUT', '30'))
+# Speech-ready format every upload is converted to before transcription
+NORMALIZED_EXTENSION = '.ogg'
+NORMALIZED_SAMPLE_RATE = 16000
+NORMALIZED_BITRATE = os.getenv('NORMALIZED_BITRATE', '32k')
+NORMALIZE_TIMEOUT = float(os.getenv('NORMALIZE_TIMEOUT', '3600'))
+FFMPEG_NICE = int(os.getenv('FFMPEG_NICE', '10'))  # added to the worker's niceness for conversions
+
+class ProbeError(Exception):
+    pass
+
+def probe_media(file_path: str, timeout: float = PROBE_TIMEOUT) -> dict:
+    """
+    Run ffprobe once and return the fields the pipeline needs:
+    duration (seconds), codec, channels and sample_rate of the first audio stream,
+    plus whether the container has a video stream.
+    """
+    cmd = ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', file_path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise ProbeError(f"ffprobe timed out after {timeout}s")
+    if result.returncode != 0:
+        raise ProbeError(result.stderr.decode('utf-8', errors='replace').strip() or "ffprobe failed")
+    probe = json.loads(result.stdout)
+    streams = probe.get('streams', [])
+    fmt = probe.get('format', {})
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+    return {
+        "duration": float(fmt.get('duration') or audio.get('duration') or 0),
+        "codec": audio.get('codec_name'),
+        "channels": int(audio['channels']) if audio.get('channels') else None,
+        "sample_rate": int(audio['sample_rate']) if audio.get('sample_rate') else None,
+        "has_video": any(s.get('codec_type') == 'video' for s in streams),
+    }
+
+def get_media_duration(file_path: str) -> float:
+    """Get media file duration in seconds."""
+    try:
+        return probe_media(file_path)["duration"]
+    except Exception as e:
+        logger.error(f"Error getting media duration for {file_path}: {e}")
+        return 0.0
+
+def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Return the sha256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+_SILENCE_START_RE = re.compile(r"silence_start: (-?[0-9.]+)")
+_SILENCE_END_RE = re.compile(r"silence_end: (-?[0-9.]+)")
+
+def detect_silences(file_path: str, noise_db: int = -35, min_silence: float = 0.4, timeout: float = 600) -> list:
+    """Return (start, end) pairs of silent stretches found by ffmpeg's silencedetect filter."""
+    cmd = [
+        'ffmpeg', '-hide_banner', '-nostats', '-i', file_path, '-vn',
+        '-af', f'silencedetect=noise={noise_db}dB:d={min_silence}', '-f', 'null', '-'
+    ]
+    result = subprocess.run(cmd, capture_output=True, timeout=timeout)
+    output = result.stderr.decode('utf-8', errors='replace')
+    if result.returncode != 0:
+        # A partial read would plan chunks on a truncated silence list; the error is at the end
+        raise RuntimeError(output.strip()[-2000:] or "ffmpeg silencedetect failed")
+    silences = []
+    start = None
+    for line in output.splitlines():
+        match = _SILENCE_START_RE.search(line)
+        if match:
+            start = max(float(match.group(1)), 0.0)
+            continue
+        match = _SILENCE_END_RE.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    return silences
+
+def plan_chunks(duration: float, silences: list, target_length: float = 600.0, overlap: float = 2.0, search_window: float = 60.0) -> list:
+    """
+    Split [0, duration] into (start, end) chunks of roughly `target_length` seconds.
+    Each cut is moved to the middle of the silence closest to the ideal cut point
+    (within `search_window` seconds), and neighbouring chunks overlap by `overlap`
+    seconds around the cut so words on the boundary are heard in full by one side.
+    """
+    cuts = []
+    ideal = target_length
+    while ideal < duration - target_length / 4:
+        candidates = [(s + e) / 2 for s, e in silences if abs((s + e) / 2 - ideal) <= search_window]
+        cut = min(candidates, key=lambda c: abs(c - ideal)) if candidates else ideal
+        if cuts and cut <= cuts[-1]:
+            cut = ideal
+        cuts.append(cut)
+        ideal = cut + target_length
+    bounds = [0.0] + cuts + [duration]
+    half = overlap / 2
+    return [
+        (max(bounds[i] - half, 0.0), min(bounds[i + 1] + half, duration))
+        for i in range(len(bounds) - 1)
+    ]
+
+def extract_segment(src_path: str, dst_path: str, start: float, end: float, timeout: float = 600):
+    """Cut [start, end) out of src_path as 16 kHz mono FLAC, which keeps timestamps exact."""
+    cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+        '-ss', f'{start:.3f}', '-t', f'{end - start:.3f}', '-i', src_path,
+        '-vn', '-ac', '1', '-ar', '16000', '-c:a', 'flac', dst_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode('utf-8', errors='replace').strip() or "ffmpeg failed")
+
+_OUT_TIME_RE = re.compile(rb"out_time_us=(\d+)")
+
+def _lower_priority():
+    os.nice(FFMPEG_NICE)
+
+def normalize_audio(src_path: str, dst_path: str, timeout: float = NORMALIZE_TIMEOUT) -> float:
+    """
+    Convert any upload, audio or video, to speech-ready audio in one ffmpeg pass: the first
+    audio stream, downmixed to 16 kHz mono Opus in an Ogg container. ffmpeg runs at lower
+    priority than the worker. Returns the duration in seconds, taken from ffmpeg's progress
+    output so the result doesn't need probing again.
+    """
+    cmd = [
+        'ffmpeg', '-hide_banner', '-nostdin', '-loglevel', 'error', '-nostats', '-y', '-i', src_path,
+        '-map', '0:a:0', '-vn', '-ac', '1', '-ar', str(NORMALIZED_SAMPLE_RATE),
+        '-c:a', 'libopus', '-b:a', NORMALIZED_BITRATE, '-application', 'voip',
+        '-progress', 'pipe:1', '-f', 'ogg', dst_path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=timeout, preexec_fn=_lower_priority)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"ffmpeg timed out after {timeout}s")
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode('utf-8', errors='replace').strip() or "ffmpeg failed")
+    out_times = _OUT_TIME_RE.findall(result.stdout)
+    return int(out_times[-1]) / 1e6 if out_times else 0.0
+
+class PipeReader:
+    """
+    Read-only view of a subprocess pipe. It has no fileno() or seek(), so httpx sends it
+    with chunked transfer encoding rather than trusting fstat's size (0) for a pipe.
+    """
+
+    def __init__(self, pipe):
+        self._pipe = pipe
+        self._opened_at = time.monotonic()
+        self.first_byte_after: Optional[float] = None
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._pipe.read(size)
+        if data and self.first_byte_after is None:
+            self.first_byte_after = time.monotonic() - self._opened_at
+        self.bytes_read += len(data)
+        return data
+
+@contextmanager
+def normalized_audio_stream(src_path: str, timeout: float = NORMALIZE_TIMEOUT) -> Iterator[PipeReader]:
+    """
+    Same conversion as normalize_audio, but ffmpeg writes to a pipe that the caller reads
+    while it runs. ffmpeg's exit status is checked when the block ends, so a conversion
+    that failed part-way raises instead of passing off truncated audio as complete.
+    """
+    cmd = [
+        'ffmpeg', '-hide_banner', '-nostdin', '-loglevel', 'error', '-nostats', '-i', src_path,
+        '-map', '0:a:0', '-vn', '-ac', '1', '-ar', str(NORMALIZED_SAMPLE_RATE),
+        '-c:a', 'libopus', '-b:a', NORMALIZED_BITRATE, '-application', 'voip', '-f', 'ogg', 'pipe:1'
+    ]
+    # stderr goes to a file, not a pipe: nobody reads it until the upload is done, and
+    # ffmpeg logs one line per bad packet, so a pipe would fill up and stall the conversion
+    stderr = tempfile.TemporaryFile()
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, preexec_fn=_lower_priority)
+    try:
+        yield PipeReader(process.stdout)
+        process.stdout.read()  # drain whatever the reader left, so ffmpeg can exit
+        if process.wait(timeout=timeout) != 0:
+            stderr.seek(0)
+            message = stderr.read()[-4096:].decode('utf-8', errors='replace').strip()
+            raise RuntimeError(message or "ffmpeg failed")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        stderr.close()
+
+class MediaProber:
+    """
+    Runs ffprobe on a small thread pool so request handlers never block the event loop.
+    At most `max_concurrency` probes run at once; further callers wait for a free slot,
+    and each probe is killed once it exceeds `timeout` seconds.
+    """
+
+    def __init__(self, max_concurrency: int = PROBE_MAX_CONCURRENCY, timeout: float = PROBE_TIMEOUT):
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='ffprobe')
+        self._semaphore = None
+
+    async def probe(self, file_path: str) -> Optional[dict]:
+        """Return probe_media() for the file, or None if it can't be probed."""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None:
+            # Created lazily so it binds to the server's event loop, not the import-time one
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            try:
+                return await loop.run_in_executor(self._executor, probe_media, file_path, self.timeout)
+            except Exception as e:
+                logger.error(f"Error probing media {file_path}: {e}")
+                return None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+media_prober = MediaProber()
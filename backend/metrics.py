@@ -0,0 +1,118 @@
+# backend/metrics.py
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable, Optional
+import redis
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess, start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from logging_config import logger
+
+# uvicorn runs several worker processes and Celery forks pool processes, so in production
+# every process writes its samples to PROMETHEUS_MULTIPROC_DIR and a scrape aggregates them.
+# Without it (local runs) the in-process default registry is used.
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+WORKER_METRICS_PORT = int(os.getenv('CELERY_METRICS_PORT', '9808'))
+if MULTIPROC_DIR:
+    # docker-entrypoint.sh creates (and empties) it; this covers processes started some other way
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+STAGE_BUCKETS = (0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ['method', 'route', 'status'], buckets=LATENCY_BUCKETS
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'DB queries issued while serving one request', ['route'], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+)
+REQUEST_DB_SECONDS = Histogram(
+    'http_request_db_seconds', 'Time spent in DB queries while serving one request', ['route'], buckets=LATENCY_BUCKETS
+)
+DB_QUERY_SECONDS = Histogram('db_query_duration_seconds', 'Duration of single DB queries', ['engine'], buckets=LATENCY_BUCKETS)
+SSE_CONNECTIONS = Gauge('sse_connections', 'Open SSE connections', multiprocess_mode='livesum')
+STAGE_SECONDS = Histogram('transcription_stage_seconds', 'Time per transcription pipeline stage', ['stage'], buckets=STAGE_BUCKETS)
+BYTES_UPLOADED = Counter('transcription_bytes_uploaded_total', 'Audio bytes sent to the transcription API', ['mode'])
+JOBS_FINISHED = Counter('transcription_jobs_total', 'Transcription jobs by outcome', ['status'])
+QUEUE_WAIT = Histogram('transcription_queue_wait_seconds', 'Time from enqueue to start per lane', ['queue'], buckets=STAGE_BUCKETS)
+
+# [query count, seconds in queries] for the request being served; middleware sets a fresh
+# list per request, and the thread pool and SQLAlchemy's async greenlets share it
+_request_db: ContextVar[Optional[list]] = ContextVar('request_db', default=None)
+
+def start_request_db_stats() -> list:
+    stats = [0, 0.0]
+    _request_db.set(stats)
+    return stats
+
+def instrument_engine(engine, name: str):
+    """Time every statement on a (sync) engine; pass async_engine.sync_engine for the async one."""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        DB_QUERY_SECONDS.labels(name).observe(elapsed)
+        stats = _request_db.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+
+@contextmanager
+def stage_timer(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+class QueueDepthCollector:
+    """Celery queue lengths, read from the Redis broker at scrape time."""
+
+    def __init__(self, redis_client: redis.Redis, queues: Iterable[str]):
+        self.redis = redis_client
+        self.queues = list(queues)
+
+    def collect(self):
+        family = GaugeMetricFamily('celery_queue_depth', 'Messages waiting in each Celery queue', labels=['queue'])
+        try:
+            pipe = self.redis.pipeline()
+            for queue in self.queues:
+                pipe.llen(queue)
+            depths = pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Reading queue depths for metrics failed: {e}")
+            return
+        for queue, depth in zip(self.queues, depths):
+            family.add_metric([queue], depth)
+        yield family
+
+def _registry() -> CollectorRegistry:
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+def render(*collectors) -> bytes:
+    """Exposition text for this service (all its processes) plus any scrape-time collectors."""
+    extra = CollectorRegistry(auto_describe=False)
+    for collector in collectors:
+        extra.register(collector)
+    return generate_latest(_registry()) + generate_latest(extra)
+
+def mark_process_dead(pid: int):
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
+
+def start_worker_exporter(port: int = WORKER_METRICS_PORT):
+    """Serve a Celery worker's metrics (all its pool processes) on their own port."""
+    start_http_server(port, registry=_registry())
+    logger.info(f"Worker metrics on port {port}")
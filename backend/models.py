@@ -1,7 +1,7 @@
 # backend/models.py
 
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Float, Boolean, JSON, Enum as SQLEnum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Float, Boolean, JSON, LargeBinary, UniqueConstraint, Index, Enum as SQLEnum
+from sqlalchemy.orm import relationship, deferred
 from database import Base
 from datetime import datetime, timezone
 from enum import Enum
@@ -32,6 +32,13 @@ class User(Base):
 
 class UploadedFile(Base):
     __tablename__ = 'uploaded_files'
+    # Serves the per-user listing, newest first, with (upload_time, id) keyset pagination
+    __table_args__ = (
+        Index('ix_uploaded_files_user_upload_time', 'user_id', 'upload_time', 'id'),
+        Index('ix_uploaded_files_user_status', 'user_id', 'status'),
+        # Time window scans for the admin latency report
+        Index('ix_uploaded_files_finished_at', 'finished_at'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     is_video = Column(Boolean, default=False)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -45,10 +52,36 @@ class UploadedFile(Base):
     language = Column(String, default='fa')
     media_duration = Column(Integer, default=0)  # Duration in seconds
     summary = Column(Text, nullable=True)  # for summary
+    media_info = Column(JSON, nullable=True)  # ffprobe result: duration, codec, channels, sample_rate, has_video
+    content_hash = Column(String(64), nullable=True, index=True)  # sha256 of the uploaded bytes
+    transcript_data = deferred(Column(LargeBinary, nullable=True))  # packed transcript.Transcript
+    # Service-API (/api/transcribe) jobs
+    source_url = Column(String, nullable=True)
+    destination_language = Column(String, nullable=True)
+    callback_url = Column(String, nullable=True)
+    external_upload_token = Column(String, nullable=True, index=True)
+    callback_status = Column(String, nullable=True)  # retrying, delivered, dead
+    callback_attempts = Column(Integer, default=0)
+    callback_error = Column(Text, nullable=True)
+    callback_delivered_at = Column(DateTime, nullable=True)
+    timeline = Column(JSON, nullable=True)  # timeline.JobTimeline: queue wait and per-stage durations
+    finished_at = Column(DateTime, nullable=True)  # last time transcribe_file reached transcribed/error
     user = relationship("User", back_populates="files")
+    exports = relationship("TranscriptExport", back_populates="uploaded_file", cascade="all, delete-orphan")
+
+class TranscriptExport(Base):
+    __tablename__ = 'transcript_exports'
+    __table_args__ = (UniqueConstraint('uploaded_file_id', 'format', name='uq_transcript_exports_file_format'),)
+    id = Column(Integer, primary_key=True, index=True)
+    uploaded_file_id = Column(Integer, ForeignKey('uploaded_files.id', ondelete='CASCADE'), nullable=False, index=True)
+    format = Column(String, nullable=False)  # txt, srt, vtt, json
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    uploaded_file = relationship("UploadedFile", back_populates="exports")
 
 class UserActivity(Base):
     __tablename__ = 'user_activities'
+    __table_args__ = (Index('ix_user_activities_user_type_time', 'user_id', 'activity_type', 'timestamp'),)
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     activity_type = Column(String, nullable=False)  # e.g., 'signup', 'login', 'logout'
@@ -7,10 +7,11 @@ from sqlalchemy.orm import Session
 from typing import Optional
 from logging_config import logger
 import os
-import requests
+from http_clients import http_pool
 from fastapi.responses import RedirectResponse, JSONResponse
 from database import get_db
 from dependencies import get_current_user
+from identity import invalidate_identity
 from models import User, PaymentTransaction, PaymentStatus, DiscountCode, DiscountUsage
 from schemas import PurchaseTimeRequest, ValidateDiscountRequest, ValidateDiscountResponse
 from datetime import datetime, timedelta, timezone
@@ -142,7 +143,7 @@ async def initiate_purchase(
             "metadata": metadata
         }
         
-        response = requests.post(ZARINPAL_REQUEST_URL, json=zarinpal_request)
+        response = await http_pool.post(ZARINPAL_REQUEST_URL, json=zarinpal_request)
         data = response.json()
         
         if response.status_code == 200 and data.get("data", {}).get("code") == 100:
@@ -201,7 +202,8 @@ async def verify_payment(
     }
     
     try:
-        response = requests.post(ZARINPAL_VERIFY_URL, json=verify_data)
+        # Verification is idempotent on Zarinpal's side (code 101 = already verified), so retry it
+        response = await http_pool.post(ZARINPAL_VERIFY_URL, json=verify_data, retries=2)
         data = response.json()
         
         if response.status_code == 200 and data.get("data", {}).get("code") in [100, 101]:
@@ -223,6 +225,7 @@ async def verify_payment(
                 user.remaining_time += transaction.hours_purchased * 60
                 user.expiration_date = datetime.now(timezone.utc) + timedelta(days=31)
                 db.commit()
+                invalidate_identity(user.id)
             logger.info(
                 f"[Payment] Payment success. user_id={user_id}, email={user_email}, "
                 f"transaction_id={transaction_id}, ref_id={transaction.reference_id}"
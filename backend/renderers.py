@@ -0,0 +1,58 @@
+# backend/renderers.py
+
+from typing import Iterator, Optional
+import subtitles
+from subtitles import SubtitleProfile
+
+def _speaker_columns(transcription):
+    """(types, texts, speaker_ids) sequences, read from Transcript columns when available."""
+    columns = getattr(transcription, 'columns', None)
+    if columns is not None:
+        return columns["type"], columns["text"], columns["speaker_id"]
+    words = transcription.words
+    return [w.type for w in words], [w.text for w in words], [w.speaker_id for w in words]
+
+def iter_srt(transcription, time_formatter=None, profile: Optional[SubtitleProfile] = None) -> Iterator[str]:
+    """Yield SRT cues one at a time, segmented according to profile."""
+    return subtitles.iter_srt(subtitles.segment(transcription, profile or subtitles.PROFILES['default']), time_formatter)
+
+def iter_vtt(transcription, profile: Optional[SubtitleProfile] = None) -> Iterator[str]:
+    """Yield a WebVTT document cue by cue, using the same segmentation as SRT."""
+    return subtitles.iter_vtt(subtitles.segment(transcription, profile or subtitles.PROFILES['default']))
+
+def iter_txt(transcription) -> Iterator[str]:
+    """Yield plain text; with diarization, one line per speaker turn prefixed by its label."""
+    types, texts, speakers = _speaker_columns(transcription)
+    if not any(speaker is not None for speaker in speakers):
+        yield transcription.text
+        return
+    current_speaker = None
+    line = []
+    for word_type, text, speaker in zip(types, texts, speakers):
+        if word_type != 'word':
+            continue
+        if speaker != current_speaker:
+            if line:
+                yield " ".join(line) + "\n"
+            line = [f"{speaker}:"]
+            current_speaker = speaker
+        line.append(text)
+    if line:
+        yield " ".join(line)
+
+def iter_format(transcription, output_format, profile: Optional[SubtitleProfile] = None) -> Iterator[str]:
+    """Yield the transcription rendered in output_format, piece by piece."""
+    if output_format == 'txt':
+        return iter_txt(transcription)
+    elif output_format == 'srt':
+        return iter_srt(transcription, profile=profile)
+    elif output_format == 'vtt':
+        return iter_vtt(transcription, profile=profile)
+    elif output_format == 'json':
+        return iter((transcription.json(),))
+    else:
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+def convert_transcription_to_format(transcription, output_format, profile: Optional[SubtitleProfile] = None):
+    """Convert a transcription (Transcript or ElevenLabs response) to the specified output format."""
+    return "".join(iter_format(transcription, output_format, profile))
@@ -0,0 +1,119 @@
+# backend/scheduling.py
+
+import json
+import os
+import time
+from typing import Dict, List, Optional
+import redis
+from logging_config import logger
+import metrics
+
+SERVICE_USER_EMAIL = "transcription_service@tootty.com"
+
+# Transcription lanes (Celery queues). Service-API jobs get their own lane, which every
+# transcription worker drains first; interactive uploads split on duration so a burst
+# of long recordings can't hold up short clips.
+PRIORITY_QUEUE = 'transcription_priority'
+SHORT_QUEUE = 'transcription_short'
+LONG_QUEUE = 'transcription_long'
+TRANSCRIPTION_QUEUES = (PRIORITY_QUEUE, SHORT_QUEUE, LONG_QUEUE)
+SHORT_JOB_MAX_SECONDS = int(os.getenv('SHORT_JOB_MAX_SECONDS', '600'))
+
+# Fair share: at most this many of a user's jobs transcribe at once; the rest wait their
+# turn (re-queued after FAIR_SHARE_RETRY_DELAY) so other users' jobs get the workers
+MAX_ACTIVE_JOBS_PER_USER = int(os.getenv('MAX_ACTIVE_JOBS_PER_USER', '2'))
+FAIR_SHARE_RETRY_DELAY = 15
+SLOT_TTL = 7200 + 300  # a crashed worker's slot frees itself after the task time limit
+
+WAIT_SAMPLES = 1000  # recent wait times kept per lane
+ENQUEUED_TTL = 2 * 24 * 3600
+
+redis_client = redis.Redis(host='redis', port=6379, db=0)
+
+# Drops expired slots, then takes one unless the user is at the limit. A job that already
+# holds a slot (a Celery retry of the same file) keeps it.
+_acquire_slot = redis_client.register_script("""
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if not redis.call('ZSCORE', KEYS[1], ARGV[3]) and redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[4]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+""")
+
+def transcription_queue(media_duration: int, is_service: bool = False) -> str:
+    if is_service:
+        return PRIORITY_QUEUE
+    return SHORT_QUEUE if (media_duration or 0) <= SHORT_JOB_MAX_SECONDS else LONG_QUEUE
+
+def _slots_key(user_id: int) -> str:
+    return f"active_jobs:{user_id}"
+
+def acquire_slot(user_id: int, file_id: int) -> bool:
+    """Take one of the user's fair-share slots; True if the job may run now. Fails open if Redis is down."""
+    now = time.time()
+    try:
+        return bool(_acquire_slot(keys=[_slots_key(user_id)], args=[now, now + SLOT_TTL, file_id, MAX_ACTIVE_JOBS_PER_USER, SLOT_TTL]))
+    except redis.RedisError as e:
+        logger.warning(f"Fair-share slot check failed for user {user_id}, running file {file_id} anyway: {e}")
+        return True
+
+def release_slot(user_id: int, file_id: int):
+    try:
+        redis_client.zrem(_slots_key(user_id), file_id)
+    except redis.RedisError as e:
+        logger.warning(f"Releasing fair-share slot for file {file_id} failed (expires on its own): {e}")
+
+def mark_enqueued(file_id: int, queue: str):
+    """Remember when a job entered its lane, for the wait-time figures."""
+    try:
+        redis_client.set(f"job_enqueued:{file_id}", json.dumps({"queue": queue, "at": time.time()}), ex=ENQUEUED_TTL)
+    except redis.RedisError as e:
+        logger.warning(f"Could not record enqueue time for file {file_id}: {e}")
+
+def record_wait(file_id: int) -> Optional[dict]:
+    """
+    Called when a job starts: adds its time in the queue (fair-share deferrals included) to
+    its lane's samples. Returns {"queue", "at", "wait"} (None for a retry or if Redis is down).
+    """
+    try:
+        pipe = redis_client.pipeline()
+        pipe.get(f"job_enqueued:{file_id}")
+        pipe.delete(f"job_enqueued:{file_id}")
+        marker = pipe.execute()[0]
+        if not marker:
+            return None
+        marker = json.loads(marker)
+        wait = marker['wait'] = time.time() - marker['at']
+        metrics.QUEUE_WAIT.labels(marker['queue']).observe(wait)
+        pipe = redis_client.pipeline()
+        pipe.lpush(f"queue_wait:{marker['queue']}", round(wait, 1))
+        pipe.ltrim(f"queue_wait:{marker['queue']}", 0, WAIT_SAMPLES - 1)
+        pipe.execute()
+        return marker
+    except redis.RedisError as e:
+        logger.warning(f"Could not record wait time for file {file_id}: {e}")
+        return None
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+def queue_stats() -> Dict[str, dict]:
+    """Per lane: messages waiting in the broker and wait-time percentiles over recent jobs."""
+    pipe = redis_client.pipeline()
+    for queue in TRANSCRIPTION_QUEUES:
+        pipe.llen(queue)
+        pipe.lrange(f"queue_wait:{queue}", 0, -1)
+    results = pipe.execute()
+    stats = {}
+    for index, queue in enumerate(TRANSCRIPTION_QUEUES):
+        depth, samples = results[2 * index], sorted(float(s) for s in results[2 * index + 1])
+        stats[queue] = {
+            "depth": depth,
+            "wait_samples": len(samples),
+            "wait_p50": _percentile(samples, 0.5) if samples else None,
+            "wait_p95": _percentile(samples, 0.95) if samples else None,
+            "wait_max": samples[-1] if samples else None,
+        }
+    return stats
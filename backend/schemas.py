@@ -24,8 +24,9 @@ class User(UserBase):
         from_attributes = True
 
 class UserListResponse(BaseModel):
-    total: int
+    total: Optional[int] = None
     users: List[User]
+    next_cursor: Optional[str] = None
     class Config:
         from_attributes = True
 
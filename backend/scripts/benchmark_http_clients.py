@@ -0,0 +1,106 @@
+# backend/scripts/benchmark_http_clients.py
+
+import sys
+import os
+import asyncio
+import threading
+import time
+import requests
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_clients import HTTPClientPool, CircuitOpenError
+
+def start_stub_upstream(delay: float, status: int = 200) -> str:
+    """
+    Minimal keep-alive HTTP/1.1 server answering every request after `delay` seconds.
+    It runs its own event loop in a daemon thread, so a blocking client can't stall it.
+    """
+    body = b'{"ok": true}'
+    reason = {200: b"OK", 503: b"Service Unavailable"}.get(status, b"Status")
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                await asyncio.sleep(delay)
+                writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (status, reason, len(body), body))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    server = asyncio.run_coroutine_threadsafe(asyncio.start_server(handle, "127.0.0.1", 0), loop).result()
+    return f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/"
+
+async def measure(call, requests_in_flight: int, duration: float):
+    """
+    Keep requests_in_flight upstream calls going for `duration` seconds while a probe task
+    measures how late the event loop wakes it up: what every other request on the worker
+    would experience.
+    """
+    completed = 0
+    lags = []
+    deadline = time.perf_counter() + duration
+
+    async def caller():
+        nonlocal completed
+        while time.perf_counter() < deadline:
+            await call()
+            completed += 1
+
+    async def probe():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+
+    started = time.perf_counter()
+    await asyncio.gather(probe(), *(caller() for _ in range(requests_in_flight)))
+    elapsed = time.perf_counter() - started
+    lags.sort()
+    return completed / elapsed, lags[int(len(lags) * 0.99)] * 1000, lags[-1] * 1000
+
+async def main(delay: float = 0.2, in_flight: int = 20, duration: float = 5.0):
+    url = start_stub_upstream(delay)
+    pool = HTTPClientPool()
+    session = requests.Session()
+
+    async def blocking_call():
+        # What the handlers did before: a synchronous request inside async def
+        session.get(url, timeout=10)
+
+    async def pooled_call():
+        await pool.get(url)
+
+    print(f"upstream delay {delay * 1000:.0f} ms, {in_flight} calls in flight, {duration:.0f} s per mode")
+    print(f"{'mode':>10} {'upstream req/s':>15} {'loop lag p99 ms':>16} {'loop lag max ms':>16}")
+    for name, call in (("requests", blocking_call), ("pooled", pooled_call)):
+        throughput, lag_p99, lag_max = await measure(call, in_flight, duration)
+        print(f"{name:>10} {throughput:>15.1f} {lag_p99:>16.1f} {lag_max:>16.1f}")
+
+    # A failing upstream: after the breaker opens, calls fail immediately instead of waiting
+    failing_url = start_stub_upstream(delay, status=503)
+    fast_failures, start = 0, time.perf_counter()
+    for _ in range(50):
+        try:
+            await pool.get(failing_url, retries=0)
+        except CircuitOpenError:
+            fast_failures += 1
+    print(f"failing upstream: {fast_failures}/50 calls short-circuited, {time.perf_counter() - start:.2f} s total")
+
+    await pool.close()
+    session.close()
+
+if __name__ == "__main__":
+    asyncio.run(main(*(float(arg) for arg in sys.argv[1:2])))
@@ -0,0 +1,62 @@
+# backend/scripts/benchmark_load.py
+
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run(base_url: str, paths, cookie: str, concurrency: int, total: int, timeout: float):
+    """Issue total GETs spread over paths with concurrency requests in flight; return latencies."""
+    latencies, errors = [], 0
+    counter = iter(range(total))
+    headers = {"Cookie": f"session={cookie}"} if cookie else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=timeout, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(paths[i % len(paths)])
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Concurrent GET load against the API. Run it against the previous and the "
+                    "current build with the same arguments and compare the p99 column."
+    )
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--path", action="append", dest="paths",
+                        help="Endpoint to hit; repeat to mix (default: /me and /files)")
+    parser.add_argument("--cookie", default="", help="Value of the 'session' cookie of a logged-in user")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+    paths = args.paths or ["/me", "/files?limit=10", "/files?view=slim&limit=25"]
+
+    print(f"{'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7}")
+    for concurrency in args.concurrency:
+        latencies, errors, elapsed = asyncio.run(run(args.base_url, paths, args.cookie, concurrency, args.requests, args.timeout))
+        ms = [latency * 1000 for latency in latencies]
+        print(
+            f"{concurrency:>5} {len(ms) / elapsed:>8.1f} {statistics.median(ms):>8.1f} {percentile(ms, 0.95):>8.1f} "
+            f"{percentile(ms, 0.99):>8.1f} {max(ms):>8.1f} {errors:>7}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# backend/scripts/benchmark_normalize.py
+
+import sys
+import os
+import resource
+import subprocess
+import tempfile
+import time
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media import normalize_audio, normalized_audio_stream, probe_media
+
+def generate_samples(work_dir: str, seconds: int = 600) -> list:
+    """Synthetic stand-ins for typical uploads: a 44.1 kHz stereo WAV, a FLAC and an H.264 video."""
+    speechlike = f"anoisesrc=d={seconds}:c=pink:a=0.2,volume='0.5+0.5*sin(2*PI*t/3)':eval=frame"
+    samples = {
+        "sample.wav": ['-f', 'lavfi', '-i', speechlike, '-ac', '2', '-ar', '44100'],
+        "sample.flac": ['-f', 'lavfi', '-i', speechlike, '-ac', '2', '-ar', '48000', '-c:a', 'flac'],
+        "sample.mp4": ['-f', 'lavfi', '-i', f"testsrc=d={seconds}:s=640x360:r=25", '-f', 'lavfi', '-i', speechlike,
+                       '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', '-shortest'],
+    }
+    paths = []
+    for name, args in samples.items():
+        path = os.path.join(work_dir, name)
+        subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', *args, path], check=True)
+        paths.append(path)
+    return paths
+
+def children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def measure(run):
+    cpu, wall = children_cpu(), time.perf_counter()
+    result = run()
+    return result, children_cpu() - cpu, time.perf_counter() - wall
+
+def old_pipeline(path: str, work_dir: str):
+    """Before: videos became 44.1 kHz stereo MP3 and were probed again; audio was sent as uploaded."""
+    if not probe_media(path)["has_video"]:
+        return path
+    out = os.path.join(work_dir, "old.mp3")
+    subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', path,
+                    '-f', 'mp3', '-acodec', 'libmp3lame', '-ac', '2', '-ar', '44100', out], check=True)
+    probe_media(out)
+    return out
+
+def streamed(path: str):
+    """Streaming mode: read the converted audio from ffmpeg's pipe as an upload would."""
+    with normalized_audio_stream(path) as audio:
+        while audio.read(64 * 1024):
+            pass
+    return audio
+
+def main(paths):
+    with tempfile.TemporaryDirectory(prefix="normalize_bench_") as work_dir:
+        paths = paths or generate_samples(work_dir)
+        print(f"{'file':>24} {'pipeline':>9} {'upload MB':>10} {'cpu s':>7} {'wall s':>7}")
+        for path in paths:
+            name = os.path.basename(path)[:24]
+            upload, cpu, wall = measure(lambda: old_pipeline(path, work_dir))
+            print(f"{name:>24} {'old':>9} {os.path.getsize(upload) / 1e6:>10.2f} {cpu:>7.2f} {wall:>7.2f}")
+            out = os.path.join(work_dir, "new.ogg")
+            duration, cpu, wall = measure(lambda: normalize_audio(path, out))
+            print(f"{name:>24} {'new':>9} {os.path.getsize(out) / 1e6:>10.2f} {cpu:>7.2f} {wall:>7.2f}  ({duration:.1f}s audio)")
+            audio, cpu, wall = measure(lambda: streamed(path))
+            print(f"{name:>24} {'streamed':>9} {audio.bytes_read / 1e6:>10.2f} {cpu:>7.2f} {wall:>7.2f}  (first byte after {audio.first_byte_after or 0:.2f}s, nothing written)")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,53 @@
+# backend/scripts/benchmark_render.py
+
+import sys
+import os
+import random
+import time
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transcript import Transcript, Word
+from renderers import convert_transcription_to_format
+from subtitles import PROFILES
+
+def synthetic_transcript(word_count: int, speakers: int = 3, seed: int = 0) -> Transcript:
+    """Build a transcript that looks like scribe output: words, spacings, pauses and speaker turns."""
+    rng = random.Random(seed)
+    vocabulary = ["سلام", "hello", "world", "این", "یک", "test", "است", "speech", "داده", "model."]
+    words = []
+    t = 0.0
+    speaker = "speaker_0"
+    for i in range(word_count):
+        if rng.random() < 0.02:
+            speaker = f"speaker_{rng.randrange(speakers)}"
+        length = rng.uniform(0.15, 0.6)
+        words.append(Word(rng.choice(vocabulary), t, t + length, 'word', speaker))
+        t += length
+        gap = rng.choice((0.05, 0.05, 0.1, 0.7))
+        words.append(Word(" ", t, t + gap, 'spacing', speaker))
+        t += gap
+    return Transcript.from_words(words)
+
+def benchmark(sizes, cases, repeat: int = 3):
+    print(f"{'words':>10} {'format':>6} {'profile':>10} {'best (s)':>10} {'us/word':>9}")
+    for size in sizes:
+        packed = synthetic_transcript(size).pack()
+        for output_format, profile in cases:
+            best = float('inf')
+            for _ in range(repeat):
+                # Start from the stored form each time, as the export endpoint does
+                transcript = Transcript.unpack(packed)
+                start = time.perf_counter()
+                convert_transcription_to_format(transcript, output_format, PROFILES[profile])
+                best = min(best, time.perf_counter() - start)
+            print(f"{size:>10} {output_format:>6} {profile:>10} {best:>10.3f} {best / size * 1e6:>9.2f}")
+
+if __name__ == "__main__":
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    # Doubling sizes: with linear rendering the us/word column stays flat
+    benchmark(
+        [largest // 8, largest // 4, largest // 2, largest],
+        [('txt', 'default'), ('srt', 'default'), ('vtt', 'default'), ('srt', 'broadcast'), ('srt', 'social')],
+    )
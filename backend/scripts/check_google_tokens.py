@@ -0,0 +1,104 @@
+# backend/scripts/check_google_tokens.py
+
+import sys
+import os
+import asyncio
+import datetime
+import json
+import time
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+from http_clients import HTTPClientPool
+from google_tokens import GoogleCertCache, verify_google_id_token, InvalidGoogleToken
+
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+
+def make_key(key_id: str):
+    """A locally generated RSA key: (signer, self-signed certificate PEM), like one entry of Google's certs."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, key_id)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number()).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    key_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    return crypt.RSASigner.from_string(key_pem, key_id), cert.public_bytes(serialization.Encoding.PEM).decode('ascii')
+
+def make_token(signer, **overrides) -> str:
+    now = int(time.time())
+    claims = {"iss": "https://accounts.google.com", "aud": CLIENT_ID, "sub": "1234", "email": "user@example.com",
+              "name": "Test User", "iat": now, "exp": now + 3600}
+    claims.update(overrides)
+    return jwt.encode(signer, claims).decode('ascii')
+
+async def start_stub_certs_server(certs: dict, max_age: int = 3600):
+    """Stub of Google's certs endpoint; returns the server, its URL and a request counter."""
+    hits = {"count": 0}
+
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        hits["count"] += 1
+        body = json.dumps(certs).encode('utf-8')
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nCache-Control: public, max-age=%d, must-revalidate\r\n"
+            b"Connection: close\r\nContent-Length: %d\r\n\r\n%s" % (max_age, len(body), body)
+        )
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/certs", hits
+
+async def main(iterations: int = 1000):
+    signer, cert = make_key("key-1")
+    certs = {"key-1": cert}
+    server, url, hits = await start_stub_certs_server(certs)
+    pool = HTTPClientPool()
+    cache = GoogleCertCache(url, pool)
+    await cache.start()
+
+    token = make_token(signer)
+    claims = await verify_google_id_token(token, CLIENT_ID, cache)
+    print(f"{'valid token':<32} accepted, email={claims['email']}")
+    for label, bad_token in (
+        ("wrong audience", make_token(signer, aud="someone-else")),
+        ("wrong issuer", make_token(signer, iss="https://evil.example.com")),
+        ("expired", make_token(signer, iat=int(time.time()) - 7200, exp=int(time.time()) - 3600)),
+        ("tampered", token[:-4] + ("AAAA" if not token.endswith("AAAA") else "BBBB")),
+    ):
+        try:
+            await verify_google_id_token(bad_token, CLIENT_ID, cache)
+            print(f"{label:<32} ACCEPTED (unexpected)")
+        except InvalidGoogleToken:
+            print(f"{label:<32} rejected")
+
+    # Key rotation: a token from a new key id triggers one refresh and then verifies
+    rotated_signer, rotated_cert = make_key("key-2")
+    certs["key-2"] = rotated_cert
+    before = hits["count"]
+    await verify_google_id_token(make_token(rotated_signer), CLIENT_ID, cache)
+    print(f"{'rotated key':<32} accepted after {hits['count'] - before} refresh")
+
+    before = hits["count"]
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await verify_google_id_token(token, CLIENT_ID, cache)
+    elapsed = time.perf_counter() - start
+    print(f"{iterations} verifications: {elapsed / iterations * 1e6:.0f} us each, {hits['count'] - before} certs fetches")
+
+    await cache.stop()
+    await pool.close()
+    server.close()
+    await server.wait_closed()
+
+if __name__ == "__main__":
+    asyncio.run(main())
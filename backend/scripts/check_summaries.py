@@ -0,0 +1,84 @@
+# backend/scripts/check_summaries.py
+
+import sys
+import os
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import OpenAI
+import summaries
+
+def start_stub_openai(delay: float = 0.2):
+    """
+    Local stand-in for the chat completions endpoint: answers every request after `delay`
+    seconds with a short "summary" and records how many requests ran and how many overlapped.
+    """
+    stats = {"calls": 0, "in_flight": 0, "max_in_flight": 0, "prompts": []}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            with lock:
+                stats["calls"] += 1
+                stats["in_flight"] += 1
+                stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+                stats["prompts"].append(request["messages"][0]["content"][:40])
+            time.sleep(delay)
+            user_text = request["messages"][1]["content"]
+            body = json.dumps({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": request["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": f"summary of {len(user_text)} chars"}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }).encode('utf-8')
+            with lock:
+                stats["in_flight"] -= 1
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1", stats
+
+def transcript(sentences: int) -> str:
+    line = "این یک جمله آزمایشی در متن پیاده شده است. This is a test sentence from the transcript."
+    return "\n".join(f"[{i // 60:02d}:{i % 60:02d}] {line}" for i in range(sentences))
+
+def main():
+    server, url, stats = start_stub_openai()
+    client = OpenAI(api_key="test", base_url=url, max_retries=0)
+    print(f"{'transcript chars':>16} {'chunks':>7} {'calls':>6} {'max parallel':>13} {'seconds':>8}")
+    for sentences in (50, 2000, 20000):
+        text = transcript(sentences)
+        stats.update(calls=0, max_in_flight=0, prompts=[])
+        start = time.perf_counter()
+        summary = summaries.summarize_text(text, client)
+        elapsed = time.perf_counter() - start
+        chunks = len(summaries.split_into_chunks(text))
+        print(f"{len(text):>16} {chunks:>7} {stats['calls']:>6} {stats['max_in_flight']:>13} {elapsed:>8.2f}")
+        assert stats["prompts"][-1] == summaries.SUMMARY_PROMPT[:40], "the last call must be the final summary prompt"
+        assert summary.startswith("summary of")
+
+    # Chunks respect the budget and lose nothing but the line breaks they were cut at
+    text = transcript(20000)
+    chunks = summaries.split_into_chunks(text)
+    assert all(len(chunk) <= summaries.CHUNK_MAX_TOKENS * summaries.CHARS_PER_TOKEN for chunk in chunks)
+    assert "\n".join(chunks) == text
+    assert summaries.cache_key(text) == summaries.cache_key(text[:]) != summaries.cache_key(text + " ")
+    print("chunking and cache keys: ok")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
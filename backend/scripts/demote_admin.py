@@ -8,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database import SessionLocal
 import models
+from identity import invalidate_identity
 import sys
 
 def demote_user_from_admin(email: str):
@@ -17,6 +18,7 @@ def demote_user_from_admin(email: str):
         if user:
             user.is_admin = False
             db.commit()
+            invalidate_identity(user.id)
             print(f"User {email} has been demoted from admin.")
         else:
             print(f"No user found with email: {email}")
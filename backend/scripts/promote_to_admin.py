@@ -8,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database import SessionLocal
 import models
+from identity import invalidate_identity
 import sys
 
 def promote_user_to_admin(email: str):
@@ -17,6 +18,7 @@ def promote_user_to_admin(email: str):
         if user:
             user.is_admin = True
             db.commit()
+            invalidate_identity(user.id)
             print(f"User {email} has been promoted to admin.")
         else:
             print(f"No user found with email: {email}")
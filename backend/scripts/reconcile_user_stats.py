@@ -0,0 +1,60 @@
+# backend/scripts/reconcile_user_stats.py
+
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, update, func
+from database import SessionLocal
+import models
+from user_stats import SUCCESS_STATUSES, FAILURE_STATUSES
+
+def reconcile_user_stats(dry_run: bool = False):
+    """
+    Recompute successful_jobs, failed_jobs and last_login from uploaded_files and
+    user_activities, and fix the users whose stored values differ. Used once to
+    backfill the counters, then occasionally to verify them.
+    """
+    db = SessionLocal()
+    try:
+        def count_files(statuses):
+            return select(func.count(models.UploadedFile.id)).where(
+                models.UploadedFile.user_id == models.User.id, models.UploadedFile.status.in_(statuses)
+            ).scalar_subquery()
+        successful = count_files(SUCCESS_STATUSES)
+        failed = count_files(FAILURE_STATUSES)
+        last_login = func.coalesce(
+            select(func.max(models.UserActivity.timestamp)).where(
+                models.UserActivity.user_id == models.User.id, models.UserActivity.activity_type == 'login'
+            ).scalar_subquery(),
+            models.User.last_login,
+        )
+        drifted = (
+            models.User.successful_jobs.is_distinct_from(successful)
+            | models.User.failed_jobs.is_distinct_from(failed)
+            | models.User.last_login.is_distinct_from(last_login)
+        )
+        if dry_run:
+            rows = db.query(models.User.email, models.User.successful_jobs, successful, models.User.failed_jobs, failed).filter(drifted).all()
+            for email, stored_ok, actual_ok, stored_failed, actual_failed in rows:
+                print(f"{email}: successful {stored_ok} -> {actual_ok}, failed {stored_failed} -> {actual_failed}")
+            print(f"{len(rows)} user(s) out of date.")
+            return
+        result = db.execute(
+            update(models.User)
+            .where(drifted)
+            .values(successful_jobs=successful, failed_jobs=failed, last_login=last_login)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        print(f"Reconciled {result.rowcount} user(s).")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 or (len(sys.argv) == 2 and sys.argv[1] != '--dry-run'):
+        print("Usage: python reconcile_user_stats.py [--dry-run]")
+    else:
+        reconcile_user_stats(dry_run=len(sys.argv) == 2)
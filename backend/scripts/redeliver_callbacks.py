@@ -0,0 +1,40 @@
+# backend/scripts/redeliver_callbacks.py
+
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal
+import models
+from tasks import deliver_callback
+
+def redeliver_callbacks(file_ids=None, dry_run: bool = False):
+    """
+    Queue dead-lettered callbacks (callback_status='dead') again, e.g. after a partner
+    outage. With file_ids, only those files are re-sent, whatever their state.
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(models.UploadedFile.id, models.UploadedFile.callback_url, models.UploadedFile.callback_error)
+        if file_ids:
+            query = query.filter(models.UploadedFile.id.in_(file_ids), models.UploadedFile.callback_url.isnot(None))
+        else:
+            query = query.filter(models.UploadedFile.callback_status == 'dead')
+        rows = query.order_by(models.UploadedFile.id).all()
+        for file_id, url, error in rows:
+            print(f"{file_id}: {url} ({error or 'no error recorded'})")
+            if not dry_run:
+                db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).update(
+                    {"callback_status": None, "callback_error": None}, synchronize_session=False
+                )
+                db.commit()
+                deliver_callback.delay(file_id)
+        print(f"{len(rows)} callback(s) {'to redeliver' if dry_run else 'queued'}.")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--dry-run"]
+    redeliver_callbacks([int(arg) for arg in args], dry_run="--dry-run" in sys.argv)
@@ -0,0 +1,136 @@
+# backend/sse.py
+
+import asyncio
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+import redis.asyncio as aioredis
+from logging_config import logger
+import metrics
+from events import EVENT_STREAM_MAXLEN, parse_event_id
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+SSE_MAX_CONNECTIONS = int(os.getenv('SSE_MAX_CONNECTIONS', '5000'))  # per worker process
+SSE_QUEUE_SIZE = 100           # undelivered messages kept per connection
+SSE_KEEPALIVE_INTERVAL = 15.0  # seconds
+USER_CHANNEL_PATTERN = 'user_*_updates'
+
+class SSEConnectionLimit(Exception):
+    pass
+
+class SSEBroker:
+    """
+    Process-wide fan-out of user update channels to SSE connections.
+
+    A single Redis connection pattern-subscribes to every user channel and a background
+    task pushes each message into the asyncio.Queue of every open connection for that
+    channel, so delivery is push-based and Redis connections don't grow with clients.
+    """
+
+    def __init__(self, redis_url: str = REDIS_URL, max_connections: int = SSE_MAX_CONNECTIONS, queue_size: int = SSE_QUEUE_SIZE):
+        self.redis_url = redis_url
+        self.max_connections = max_connections
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._connections = 0
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[aioredis.Redis] = None
+
+    @property
+    def connections(self) -> int:
+        return self._connections
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def _redis(self) -> aioredis.Redis:
+        if self._client is None:
+            self._client = aioredis.from_url(self.redis_url)
+        return self._client
+
+    async def latest_event_id(self, stream: str) -> Optional[str]:
+        entries = await self._redis().xrevrange(stream, count=1)
+        return entries[0][0].decode('utf-8') if entries else None
+
+    async def replay(self, stream: str, after_id: str) -> Tuple[List[Tuple[str, str]], bool]:
+        """
+        Return the (event_id, data) entries recorded after after_id, oldest first, and
+        whether they are complete, i.e. nothing after after_id was trimmed or expired.
+        """
+        client = self._redis()
+        try:
+            info = await client.xinfo_stream(stream)
+        except aioredis.ResponseError:
+            return [], False  # the stream expired, so what was missed is unknown
+        trimmed = info.get('max-deleted-entry-id')
+        if isinstance(trimmed, bytes):
+            trimmed = trimmed.decode('utf-8')
+        complete = parse_event_id(after_id) >= (parse_event_id(trimmed) or (0, 0))
+        entries = await client.xrange(stream, min=f"({after_id}", count=EVENT_STREAM_MAXLEN * 2)
+        return [(entry_id.decode('utf-8'), fields[b'data'].decode('utf-8')) for entry_id, fields in entries], complete
+
+    async def _listen(self):
+        backoff = 0.5
+        while True:
+            redis_conn = aioredis.from_url(self.redis_url)
+            pubsub = redis_conn.pubsub()
+            try:
+                await pubsub.psubscribe(USER_CHANNEL_PATTERN)
+                logger.info(f"SSE broker subscribed to {USER_CHANNEL_PATTERN}")
+                backoff = 0.5
+                async for message in pubsub.listen():
+                    if message['type'] == 'pmessage':
+                        self._dispatch(message['channel'].decode('utf-8'), message['data'].decode('utf-8'))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"SSE broker lost its Redis subscription, retrying in {backoff}s: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10.0)
+            finally:
+                try:
+                    await pubsub.close()
+                    await redis_conn.close()
+                except Exception:
+                    pass
+
+    def _dispatch(self, channel: str, data: str):
+        for queue in self._subscribers.get(channel, ()):
+            if queue.full():
+                # A stalled client loses its oldest update rather than blocking everyone else
+                queue.get_nowait()
+            queue.put_nowait(data)
+
+    async def subscribe(self, channel: str) -> asyncio.Queue:
+        if self._connections >= self.max_connections:
+            raise SSEConnectionLimit(f"SSE connection limit of {self.max_connections} reached")
+        await self.start()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[channel].add(queue)
+        self._connections += 1
+        metrics.SSE_CONNECTIONS.inc()
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(channel)
+        if queues and queue in queues:
+            queues.discard(queue)
+            self._connections -= 1
+            metrics.SSE_CONNECTIONS.dec()
+            if not queues:
+                del self._subscribers[channel]
+
+sse_broker = SSEBroker()
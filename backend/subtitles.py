@@ -0,0 +1,233 @@
+# backend/subtitles.py
+
+import itertools
+import math
+import operator
+from bisect import bisect_left, bisect_right
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+
+SENTENCE_END_PUNCTUATION = ('.', '!', '?', '…', '؟', '۔')
+CLAUSE_END_PUNCTUATION = (',', ';', ':', '،', '؛')
+
+class SubtitleProfile(NamedTuple):
+    """Segmentation rules for one subtitle style. A limit of 0 disables that rule."""
+    name: str
+    max_duration: float = 7.0          # seconds a cue may span
+    min_duration: float = 1.0          # a sentence end only closes a cue after this long
+    max_words: int = 15
+    max_gap: float = 0.5               # a pause longer than this always closes the cue
+    max_chars_per_line: int = 0
+    max_lines: int = 1
+    max_chars_per_second: float = 0.0  # reading speed; short cues are held on screen longer
+    break_at_clause: bool = True       # a cue cut by a length rule ends on punctuation if it can
+    sentence_end: Tuple[str, ...] = SENTENCE_END_PUNCTUATION
+    clause_end: Tuple[str, ...] = CLAUSE_END_PUNCTUATION
+
+PROFILES = {
+    # The historical generate_srt rules, now also aware of Persian/Arabic sentence ends. One
+    # difference: pauses are measured between spoken words, where the old loop only caught a
+    # pause when no spacing token sat between the two words
+    'default': SubtitleProfile(name='default', break_at_clause=False),
+    'broadcast': SubtitleProfile(
+        name='broadcast', max_duration=6.0, min_duration=1.0, max_words=0, max_gap=0.5,
+        max_chars_per_line=42, max_lines=2, max_chars_per_second=17.0,
+    ),
+    'social': SubtitleProfile(
+        name='social', max_duration=3.0, min_duration=0.6, max_words=7, max_gap=0.3,
+        max_chars_per_line=32, max_lines=1, max_chars_per_second=20.0,
+    ),
+}
+
+def get_profile(name: Optional[str] = None, **overrides) -> SubtitleProfile:
+    """Return a preset, optionally with some of its fields replaced for a single request."""
+    profile = PROFILES.get(name or 'default')
+    if profile is None:
+        raise ValueError(f"Unknown subtitle profile: {name}")
+    overrides = {key: value for key, value in overrides.items() if value is not None}
+    return profile._replace(**overrides) if overrides else profile
+
+class Cue(NamedTuple):
+    start: float
+    end: float
+    lines: List[str]
+
+def _word_arrays(transcription):
+    """Return (texts, starts, ends, speakers) for the spoken words only."""
+    columns = getattr(transcription, 'columns', None)
+    if columns is not None:
+        # Transcript: build the arrays straight from its columns
+        types = columns["type"]
+        index = np.flatnonzero(np.fromiter(map('word'.__eq__, types), dtype=bool, count=len(types)))
+        if len(index) == 0:
+            return [], np.empty(0), np.empty(0), []
+        pick = operator.itemgetter(*index.tolist())
+        texts = pick(columns["text"])
+        speakers = pick(columns["speaker_id"])
+        if len(index) == 1:
+            texts, speakers = (texts,), (speakers,)
+        starts = np.asarray(columns["start"], dtype=np.float64)[index] / 1000.0
+        ends = np.asarray(columns["end"], dtype=np.float64)[index] / 1000.0
+        return texts, starts, ends, speakers
+    words = [word for word in transcription.words if word.type == 'word']
+    texts = [word.text for word in words]
+    speakers = [word.speaker_id for word in words]
+    starts = np.fromiter((word.start or 0.0 for word in words), dtype=np.float64, count=len(words))
+    ends = np.fromiter((word.end or 0.0 for word in words), dtype=np.float64, count=len(words))
+    return texts, starts, ends, speakers
+
+def _ends_with(last_chars: np.ndarray, punctuation: Tuple[str, ...]) -> np.ndarray:
+    return np.isin(last_chars, np.fromiter((ord(p) for p in punctuation if len(p) == 1), dtype=np.uint32))
+
+def _next_true(flags: np.ndarray) -> np.ndarray:
+    """For each i, the smallest j >= i with flags[j], or len(flags) if there is none."""
+    n = len(flags)
+    positions = np.where(flags, np.arange(n), n)
+    return np.minimum.accumulate(positions[::-1])[::-1]
+
+def _prev_true(flags: np.ndarray) -> np.ndarray:
+    """For each i, the largest j <= i with flags[j], or -1 if there is none."""
+    positions = np.where(flags, np.arange(len(flags)), -1)
+    return np.maximum.accumulate(positions)
+
+def _wrap(words: Sequence[str], max_chars: int, max_lines: int) -> List[str]:
+    """Break a cue into balanced lines of at most max_chars characters."""
+    text = " ".join(words)
+    if not max_chars or len(text) <= max_chars:
+        return [text]
+    line_count = min(max(max_lines, 1), math.ceil(len(text) / max_chars))
+    target = min(max_chars, math.ceil(len(text) / line_count))
+    lines, current = [], ""
+    for word in words:
+        candidate = f"{current} {word}" if current else word
+        if current and len(candidate) > target and len(lines) < line_count - 1:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    lines.append(current)
+    return lines
+
+def segment(transcription, profile: SubtitleProfile = PROFILES['default']) -> List[Cue]:
+    """
+    Split a transcription into subtitle cues.
+
+    Gaps, speaker changes, punctuation flags and cumulative character counts are
+    computed for all words in one NumPy pass; the cue loop then jumps from cue to cue
+    with searchsorted/lookup tables, so its cost grows with the number of cues rather
+    than doing per-word Python work.
+    """
+    texts, starts, ends, speakers = _word_arrays(transcription)
+    n = len(texts)
+    if n == 0:
+        return []
+
+    # Last character of every word, found without a per-word Python loop: the words are
+    # joined into one UTF-32 buffer and indexed at each word's final position
+    texts = tuple(map(str.strip, texts))
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=n)
+    buffer = np.frombuffer("\n".join(texts).encode('utf-32-le'), dtype=np.uint32)
+    last_positions = np.cumsum(lengths + 1) - 2
+    last_chars = np.where(lengths > 0, buffer[np.maximum(last_positions, 0)], 0)
+    sentence_end = _ends_with(last_chars, profile.sentence_end)
+    clause_end = _ends_with(last_chars, profile.clause_end) | sentence_end
+    diarized = any(speakers)
+    if diarized:
+        codes = {}
+        speaker_codes = np.fromiter(map(codes.setdefault, speakers, itertools.count()), dtype=np.int64, count=n)
+    else:
+        speaker_codes = np.zeros(n, dtype=np.int64)
+
+    # Hard boundary after word i: long pause or speaker change before word i + 1
+    hard_break = np.zeros(n, dtype=bool)
+    hard_break[-1] = True
+    if n > 1:
+        hard_break[:-1] = (starts[1:] - ends[:-1] > profile.max_gap) | (speaker_codes[1:] != speaker_codes[:-1])
+    # Lookup tables are converted to lists: the cue loop below only does scalar
+    # indexing and bisection, which is much cheaper on lists than on NumPy arrays
+    next_hard = _next_true(hard_break).tolist()
+    next_sentence = _next_true(sentence_end).tolist()
+    prev_clause = _prev_true(clause_end).tolist()
+    # cum_chars[j] - cum_chars[i] - 1 = length of words i..j-1 joined with single spaces
+    cum_char_array = np.concatenate(([0], np.cumsum(lengths + 1)))
+    cum_chars = cum_char_array.tolist()
+    max_cue_chars = profile.max_chars_per_line * max(profile.max_lines, 1) if profile.max_chars_per_line else 0
+    running_max_end = np.maximum.accumulate(ends).tolist()
+    start_array, end_array = starts, ends
+    starts = starts.tolist()
+
+    max_duration, min_duration, max_words = profile.max_duration, profile.min_duration, profile.max_words
+    firsts, lasts = [], []
+    s = 0
+    while s < n:
+        cue_start = starts[s]
+        last = next_hard[s]
+        limited = False
+        if max_duration:
+            # First word whose end reaches max_duration still belongs to the cue
+            by_duration = bisect_left(running_max_end, cue_start + max_duration, s, last)
+            if by_duration < last:
+                last, limited = by_duration, True
+        if max_words and s + max_words - 1 < last:
+            last, limited = s + max_words - 1, True
+        if max_cue_chars:
+            # Last word that still fits in the character budget (always at least one word)
+            by_chars = max(bisect_right(cum_chars, cum_chars[s] + max_cue_chars + 1, s, last + 2) - 2, s)
+            if by_chars < last:
+                last, limited = by_chars, True
+        # A sentence end closes the cue once it has been on screen for min_duration
+        first_long_enough = bisect_left(running_max_end, cue_start + min_duration, s, last + 1)
+        if first_long_enough <= last:
+            sentence = next_sentence[first_long_enough]
+            if sentence < last:
+                last, limited = sentence, False
+        if limited and profile.break_at_clause:
+            # Cut by a length rule: prefer ending on punctuation in the second half of the cue
+            clause = prev_clause[last]
+            if s + (last - s) // 2 <= clause < last:
+                last = clause
+        firsts.append(s)
+        lasts.append(last)
+        s = last + 1
+
+    # Cue times and texts for all cues at once: times by fancy indexing, texts as
+    # slices of one space-joined string located through the cumulative character counts
+    first_index, last_index = np.asarray(firsts), np.asarray(lasts)
+    cue_starts, cue_ends = start_array[first_index], end_array[last_index]
+    if profile.max_chars_per_second:
+        # Hold short, dense cues long enough to read, without overlapping the next cue
+        chars = cum_char_array[last_index + 1] - cum_char_array[first_index] - 1
+        next_starts = np.append(cue_starts[1:], np.inf)
+        cue_ends = np.maximum(cue_ends, np.minimum(cue_starts + chars / profile.max_chars_per_second, next_starts))
+    joined = " ".join(texts)
+    cue_texts = [joined[cum_chars[f]:cum_chars[l + 1] - 1] for f, l in zip(firsts, lasts)]
+    if diarized:
+        cue_texts = [f"{speakers[f]}: {text}" if speakers[f] else text for f, text in zip(firsts, cue_texts)]
+    if profile.max_chars_per_line:
+        cue_lines = [_wrap(text.split(" "), profile.max_chars_per_line, profile.max_lines) for text in cue_texts]
+    else:
+        cue_lines = [[text] for text in cue_texts]
+    return list(map(Cue, cue_starts.tolist(), cue_ends.tolist(), cue_lines))
+
+def format_timestamps(seconds: np.ndarray, decimal_separator: str = ',') -> List[str]:
+    """Format many times as HH:MM:SS,mmm at once; milliseconds are truncated, as the old per-cue formatter did."""
+    whole = np.floor(seconds)
+    millis = ((seconds - whole) * 1000).astype(np.int64)
+    whole = whole.astype(np.int64)
+    pattern = f"%02d:%02d:%02d{decimal_separator}%03d"
+    return [pattern % parts for parts in zip((whole // 3600).tolist(), (whole % 3600 // 60).tolist(), (whole % 60).tolist(), millis.tolist())]
+
+def iter_srt(cues: List[Cue], time_formatter=None, decimal_separator: str = ',') -> Iterator[str]:
+    """Yield SRT cue blocks; timestamps are formatted in bulk unless a time_formatter is given."""
+    if time_formatter is None:
+        starts = format_timestamps(np.fromiter((cue.start for cue in cues), dtype=np.float64, count=len(cues)), decimal_separator)
+        ends = format_timestamps(np.fromiter((cue.end for cue in cues), dtype=np.float64, count=len(cues)), decimal_separator)
+    else:
+        starts = [time_formatter(cue.start) for cue in cues]
+        ends = [time_formatter(cue.end) for cue in cues]
+    for index, (cue, start, end) in enumerate(zip(cues, starts, ends), 1):
+        yield f"{index}\n{start} --> {end}\n" + "\n".join(cue.lines) + "\n\n"
+
+def iter_vtt(cues: List[Cue], time_formatter=None) -> Iterator[str]:
+    yield "WEBVTT\n\n"
+    yield from iter_srt(cues, time_formatter, decimal_separator='.')
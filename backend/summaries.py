@@ -0,0 +1,118 @@
+# backend/summaries.py
+
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import redis
+from openai import OpenAI
+from logging_config import logger
+
+SUMMARY_MODEL = os.getenv('SUMMARY_MODEL', 'gpt-5-mini')
+# Bump whenever the prompts change, so cached summaries from the old prompts are not served
+PROMPT_VERSION = 1
+SUMMARY_CACHE_TTL = int(os.getenv('SUMMARY_CACHE_TTL', str(30 * 24 * 3600)))
+# Chunking budget. Token counts are estimated at CHARS_PER_TOKEN, which is on the safe
+# side for Persian (the commonest language here); English packs about 4 characters a token.
+CHARS_PER_TOKEN = 3
+CHUNK_MAX_TOKENS = int(os.getenv('SUMMARY_CHUNK_MAX_TOKENS', '6000'))
+SUMMARY_PARALLELISM = int(os.getenv('SUMMARY_PARALLELISM', '4'))
+
+SUMMARY_PROMPT = (
+    "You are an expert summarizer and keyword extractor. Your tasks are:\n"
+    "1. To provide a concise, coherent summary of the input text.\n"
+    "2. To extract a list of the most important keywords or key phrases that capture the main ideas.\n\n"
+    "Important instructions:\n"
+    "- The summary should not exceed 200 words.\n"
+    "- The summary should be written in the same language as the input text.\n"
+    "- The list of keywords must also be in the same language and, if possible, reflect phrases exactly as they appear in the text.\n"
+    "- Focus on preserving the meaning and the key details without adding any extra information."
+)
+# Map step for long transcripts: each part is condensed, then SUMMARY_PROMPT runs over the parts
+PART_PROMPT = (
+    "You are summarizing one part of a longer transcript. Write a faithful summary of this part "
+    "in at most 150 words, in the same language as the text. Keep names, numbers, decisions and "
+    "key phrases exactly as they appear; do not add anything that is not in the text."
+)
+
+redis_client = redis.Redis(host='redis', port=6379, db=0)
+_client: Optional[OpenAI] = None
+
+def openai_client() -> OpenAI:
+    """Created on first use; OPENAI_BASE_URL (read by the SDK) points it at a stub in scripts."""
+    global _client
+    if _client is None:
+        _client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    return _client
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?؟…])\s+')
+
+def split_into_chunks(text: str, max_tokens: int = CHUNK_MAX_TOKENS) -> List[str]:
+    """
+    Pack the text into chunks of at most max_tokens (estimated), breaking between lines
+    where possible, else between sentences, and only mid-sentence as a last resort.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    for line in text.splitlines():
+        if len(line) <= max_chars:
+            pieces.append(line)
+            continue
+        for sentence in _SENTENCE_END_RE.split(line):
+            pieces.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+
+    chunks, current, size = [], [], 0
+    for piece in pieces:
+        if current and size + len(piece) + 1 > max_chars:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += len(piece) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+def _complete(client: OpenAI, system_prompt: str, text: str, max_tokens: int) -> str:
+    response = client.chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"input Text:\n\"\"\"\n{text}\n\"\"\""},
+        ],
+        max_completion_tokens=max_tokens,
+    )
+    return response.choices[0].message.content.strip()
+
+def summarize_text(text: str, client: Optional[OpenAI] = None) -> str:
+    """
+    Summary and keywords for a transcript. One call when it fits in a chunk; otherwise the
+    chunks are summarized concurrently and the final prompt runs over their summaries,
+    repeating the reduction if even those don't fit.
+    """
+    client = client or openai_client()
+    chunks = split_into_chunks(text)
+    while len(chunks) > 1:
+        logger.info(f"Summarizing {len(chunks)} chunks in parallel")
+        with ThreadPoolExecutor(max_workers=min(SUMMARY_PARALLELISM, len(chunks))) as pool:
+            parts = list(pool.map(lambda chunk: _complete(client, PART_PROMPT, chunk, 300), chunks))
+        chunks = split_into_chunks("\n\n".join(parts))
+    return _complete(client, SUMMARY_PROMPT, chunks[0] if chunks else text, 350)
+
+def cache_key(text: str) -> str:
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    return f"summary:v{PROMPT_VERSION}:{SUMMARY_MODEL}:{digest}"
+
+def cached_summary(text: str) -> Optional[str]:
+    try:
+        summary = redis_client.get(cache_key(text))
+    except redis.RedisError as e:
+        logger.warning(f"Summary cache read failed: {e}")
+        return None
+    return summary.decode('utf-8') if summary else None
+
+def store_summary(text: str, summary: str):
+    try:
+        redis_client.set(cache_key(text), summary, ex=SUMMARY_CACHE_TTL)
+    except redis.RedisError as e:
+        logger.warning(f"Summary cache write failed: {e}")
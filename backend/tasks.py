@@ -3,133 +3,272 @@
 import os
 import json
 import redis
-import ffmpeg
 import time
+import shutil
+import threading
+import hashlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from logging_config import logger
 from celery_config import celery_app
+from media import probe_media, get_media_duration, hash_file, detect_silences, plan_chunks, extract_segment, normalize_audio, normalized_audio_stream, NORMALIZED_EXTENSION, NORMALIZED_SAMPLE_RATE
+import transcription_cache
+from transcription_cache import TranscriptionCache
+from transcript import Transcript
+from events import publish_user_event
+from user_stats import set_file_status
+import callbacks
+import scheduling
+import summaries
+import metrics
+from timeline import JobTimeline
+from identity import invalidate_identity
+from renderers import convert_transcription_to_format
+from subtitles import PROFILES
 from database import SessionLocal
 import models
+from elevenlabs import SpeechToTextChunkResponseModel
 from elevenlabs.client import ElevenLabs
 from io import BytesIO
 from sqlalchemy import update, func  # Added for atomic updates
 from httpx import Timeout
 import requests
+from requests.adapters import HTTPAdapter
+from celery import chain
 
 redis_client = redis.Redis(host='redis', port=6379, db=0)
 
-def format_time(seconds):
-    """Convert seconds to SRT time format (HH:MM:SS,MMM)."""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    seconds_int = int(seconds % 60)
-    milliseconds = int((seconds - int(seconds)) * 1000)
-    return f"{hours:02}:{minutes:02}:{seconds_int:02},{milliseconds:03}"
+ELEVENLABS_LANGUAGE_MAP = {'fa': 'fas', 'en': 'eng', 'ar': 'ara', 'tr': 'tur', 'fr': 'fra'}
 
-def ends_with_punctuation(word_text):
-    """Check if a word ends with punctuation indicating a sentence boundary."""
-    return word_text.strip().endswith(('.', '!', '?'))
+# Long media is split at silences and the pieces are transcribed in parallel
+CHUNKED_MIN_DURATION = float(os.getenv('CHUNKED_TRANSCRIPTION_MIN_DURATION', '1200'))  # seconds
+CHUNK_TARGET_SECONDS = float(os.getenv('TRANSCRIPTION_CHUNK_SECONDS', '600'))
+CHUNK_OVERLAP_SECONDS = 2.0
+CHUNK_PARALLELISM = int(os.getenv('TRANSCRIPTION_CHUNK_PARALLELISM', '4'))
+CHUNK_MAX_ATTEMPTS = 3
+CHUNK_RESULT_TTL = 24 * 3600  # finished chunks survive task retries for a day
+# Convert audio on the fly while uploading it to the API (single-request jobs). Off by
+# default: it runs the encoder on the transcription workers instead of the media workers
+STREAM_NORMALIZATION = os.getenv('STREAM_NORMALIZATION', '0') == '1'
+STREAM_MAX_ENCODERS = int(os.getenv('STREAM_MAX_ENCODERS', '4'))  # ffmpeg processes per worker
 
-def generate_srt(transcription):
+# Service-API downloads (ingest_remote_audio)
+INGEST_MAX_BYTES = int(os.getenv('INGEST_MAX_BYTES', str(1024 * 1024 * 1024)))
+INGEST_CHUNK_SIZE = 1024 * 1024
+INGEST_MAX_RETRIES = 5
+# The partner's download key waits in Redis for the ingest task instead of travelling in
+# the task message, which would leave it in the broker and in retry metadata
+DOWNLOAD_KEY_TTL = 6 * 3600  # longer than the ingest queue wait plus every retry
+
+def export_key(output_format, profile_name='default'):
+    """TranscriptExport.format value: subtitle renderings with a non-default preset are stored separately."""
+    if output_format in ('srt', 'vtt') and profile_name != 'default':
+        return f"{output_format}:{profile_name}"
+    return output_format
+
+class ChunkTranscriptionError(Exception):
+    pass
+
+def _chunk_cache_key(file_id, start, end):
+    return f"transcription_chunk:{file_id}:{start:.3f}:{end:.3f}"
+
+def transcribe_chunk(client, chunk_path, file_id, index, start, end, convert_kwargs, timeline):
     """
-    Generate SRT format from ElevenLabs transcription object with proper subtitle splitting.
-    If diarization is enabled (i.e. words have a 'speaker_id' attribute),
-    include speaker labels at the start of a new block when the speaker changes.
+    Transcribe one [start, end) chunk, cut out by prepare_chunks, retrying the API call in
+    place. Finished chunks are kept in Redis so a task retry only redoes the chunks that failed.
     """
-    words = transcription.words
-    srt_content = ""
-    index = 1
-    max_duration = 7.0    # Maximum duration per SRT entry in seconds
-    min_duration = 1.0    # Minimum duration to avoid very short entries
-    max_words = 15        # Maximum number of words per entry
-    max_gap = 0.5         # Maximum gap between words to start a new entry in seconds
-    current_start = None
-    current_end = None
-    text = ""
-    word_count = 0
-    current_speaker = None
-
-    for i, word in enumerate(words):
-        if word.type == 'word':
-            # If starting a new block, initialize start time and speaker
-            if current_start is None:
-                current_start = word.start
-                current_speaker = getattr(word, 'speaker_id', None)
-                if current_speaker:
-                    text += f"{current_speaker}: "
-            else:
-                # Check if the speaker has changed
-                speaker = getattr(word, 'speaker_id', None)
-                if speaker and speaker != current_speaker:
-                    # End the current block and start a new one with the new speaker label
-                    srt_content += f"{index}\n{format_time(current_start)} --> {format_time(current_end)}\n{text.strip()}\n\n"
-                    index += 1
-                    current_start = word.start
-                    text = ""
-                    current_speaker = speaker
-                    if current_speaker:
-                        text += f"{current_speaker}: "
-
-            current_end = word.end
-            text += word.text + " "
-            word_count += 1
-
-            # Calculate the duration of the current block
-            duration = current_end - current_start
-            is_punctuation = ends_with_punctuation(word.text)
-
-            # Conditions to end the current SRT entry:
-            if (duration >= max_duration or
-                word_count >= max_words or
-                (is_punctuation and duration >= min_duration)):
-                srt_content += f"{index}\n{format_time(current_start)} --> {format_time(current_end)}\n{text.strip()}\n\n"
-                index += 1
-                current_start = None
-                text = ""
-                word_count = 0
-                current_speaker = None
-            # Check for significant gaps between words
-            elif i < len(words) - 1 and words[i + 1].type == 'word':
-                gap = words[i + 1].start - word.end
-                if gap > max_gap:
-                    srt_content += f"{index}\n{format_time(current_start)} --> {format_time(current_end)}\n{text.strip()}\n\n"
-                    index += 1
-                    current_start = None
-                    text = ""
-                    word_count = 0
-                    current_speaker = None
-
-    # Append any remaining text as the final SRT entry
-    if current_start is not None and text.strip():
-        srt_content += f"{index}\n{format_time(current_start)} --> {format_time(current_end)}\n{text.strip()}\n\n"
-
-    return srt_content
-
-def convert_transcription_to_format(transcription, output_format):
-    """Convert ElevenLabs transcription to the specified output format."""
-    if output_format == 'txt':
-        # Check if diarization is enabled by looking for speaker_id in words
-        if any(hasattr(word, 'speaker_id') for word in transcription.words):
-            # Generate txt with speaker labels
-            text = ""
-            current_speaker = None
-            for word in transcription.words:
-                if word.type == 'word':
-                    speaker = getattr(word, 'speaker_id', None)
-                    if speaker != current_speaker:
-                        if current_speaker is not None:
-                            text += "\n"
-                        text += f"{speaker}: "
-                        current_speaker = speaker
-                    text += word.text + " "
-            return text.strip()
-        else:
-            return transcription.text
-    elif output_format == 'srt':
-        return generate_srt(transcription)
-    elif output_format == 'json':
-        return transcription.json()
+    cache_key = _chunk_cache_key(file_id, start, end)
+    cached = redis_client.get(cache_key)
+    if cached:
+        return SpeechToTextChunkResponseModel.model_validate_json(cached)
+
+    for attempt in range(1, CHUNK_MAX_ATTEMPTS + 1):
+        try:
+            with open(chunk_path, 'rb') as chunk_stream:
+                transcription = client.speech_to_text.convert(file=chunk_stream, **convert_kwargs)
+            timeline.record_upload('chunk', os.path.getsize(chunk_path))
+            break
+        except Exception as e:
+            if attempt == CHUNK_MAX_ATTEMPTS:
+                raise
+            logger.warning(f"[transcribe_chunk] Attempt {attempt} failed. file_id={file_id}, chunk={index}: {e}")
+            time.sleep(2 ** attempt)
+
+    redis_client.set(cache_key, transcription.json(), ex=CHUNK_RESULT_TTL)
+    return transcription
+
+def merge_chunk_transcriptions(plan, results):
+    """
+    Stitch per-chunk transcriptions into one, shifting word timestamps by each chunk's
+    offset. Overlaps are resolved at their midpoint: each side keeps only the words that
+    start on its half, and a word repeated right at the cut is dropped once.
+    """
+    merged_words = []
+    for i, ((start, end), transcription) in enumerate(zip(plan, results)):
+        keep_from = 0.0 if i == 0 else (start + plan[i - 1][1]) / 2
+        keep_until = float('inf') if i == len(plan) - 1 else (plan[i + 1][0] + end) / 2
+        chunk_words = []
+        for word in transcription.words:
+            word_start = (word.start or 0.0) + start
+            if keep_from <= word_start < keep_until:
+                chunk_words.append(word.model_copy(update={'start': word_start, 'end': (word.end or 0.0) + start}))
+        while chunk_words and chunk_words[0].type == 'spacing':
+            chunk_words.pop(0)
+        if merged_words and chunk_words:
+            last, first = merged_words[-1], chunk_words[0]
+            if (first.type == 'word' and last.type == 'word' and
+                    first.text.strip() == last.text.strip() and abs(first.start - last.start) < 0.5):
+                chunk_words.pop(0)
+            if chunk_words and chunk_words[0].type == 'word' and last.type != 'spacing':
+                merged_words.append(chunk_words[0].model_copy(update={'text': ' ', 'type': 'spacing', 'start': last.end, 'end': chunk_words[0].start}))
+        merged_words.extend(chunk_words)
+
+    if any(word.type == 'spacing' for word in merged_words):
+        text = "".join(word.text for word in merged_words).strip()
     else:
-        raise ValueError(f"Unsupported output format: {output_format}")
+        text = " ".join(word.text for word in merged_words)
+    return results[0].model_copy(update={'words': merged_words, 'text': text})
+
+def transcribe_in_chunks(client, chunks, file_id, convert_kwargs, timeline):
+    """Transcribe the chunks prepared by prepare_chunks in parallel and merge the results."""
+    plan = [(start, end) for start, end, _ in chunks]
+    logger.info(f"[transcribe_file] Chunked mode. file_id={file_id}, chunks={len(plan)}, parallelism={CHUNK_PARALLELISM}")
+
+    results = [None] * len(plan)
+    failed = []
+    with ThreadPoolExecutor(max_workers=min(CHUNK_PARALLELISM, len(plan))) as pool:
+        futures = {
+            pool.submit(transcribe_chunk, client, path, file_id, index, start, end, convert_kwargs, timeline): index
+            for index, (start, end, path) in enumerate(chunks)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                logger.error(f"[transcribe_file] Chunk failed. file_id={file_id}, chunk={index}: {e}")
+                failed.append(index)
+
+    if failed:
+        raise ChunkTranscriptionError(f"{len(failed)} of {len(plan)} chunks failed: {sorted(failed)}")
+
+    transcription = merge_chunk_transcriptions(plan, results)
+    redis_client.delete(*[_chunk_cache_key(file_id, start, end) for start, end in plan])
+    return transcription
+
+def is_chunked(uploaded_file, diarize) -> bool:
+    """Long media is transcribed in chunks; speaker ids are assigned per request, so diarized jobs can't be split."""
+    return not diarize and (uploaded_file.media_duration or 0) >= CHUNKED_MIN_DURATION
+
+def chunk_dir(uploaded_file) -> str:
+    return os.path.join(os.path.dirname(uploaded_file.filepath), f"chunks_{uploaded_file.id}")
+
+def chunks_ready(uploaded_file) -> bool:
+    chunks = (uploaded_file.media_info or {}).get('chunks')
+    return bool(chunks) and all(os.path.exists(path) for _, _, path in chunks)
+
+def prepare_chunks(db, uploaded_file, timeline):
+    """
+    Split the file at silences (media.plan_chunks) and cut every chunk out to its own FLAC
+    file, recorded as media_info["chunks"] = [[start, end, path], ...]. Runs on the media
+    workers, so transcribe_file only uploads; the files go when the job finishes.
+    """
+    work_dir = chunk_dir(uploaded_file)
+    with timeline.stage('chunk'):
+        silences = detect_silences(uploaded_file.filepath)
+        plan = plan_chunks(uploaded_file.media_duration, silences, CHUNK_TARGET_SECONDS, CHUNK_OVERLAP_SECONDS)
+        os.makedirs(work_dir, exist_ok=True)
+        chunks = []
+        for index, (start, end) in enumerate(plan):
+            chunk_path = os.path.join(work_dir, f"chunk_{index:04d}.flac")
+            extract_segment(uploaded_file.filepath, chunk_path, start, end)
+            chunks.append([start, end, chunk_path])
+    uploaded_file.media_info = dict(uploaded_file.media_info or {}, chunks=chunks)
+    db.commit()
+    logger.info(f"[prepare_chunks] file_id={uploaded_file.id}: {len(chunks)} chunks, {len(silences)} silences found")
+
+def probe_and_hash(db, uploaded_file, timeline):
+    """Fill in media_info/media_duration and content_hash for files that skipped the upload-time probe (service API downloads)."""
+    if not uploaded_file.media_duration:
+        try:
+            with timeline.stage('probe'):
+                uploaded_file.media_info = probe_media(uploaded_file.filepath)
+            uploaded_file.media_duration = uploaded_file.media_info["duration"]
+            db.commit()
+        except Exception as e:
+            logger.error(f"[probe_and_hash] Error probing media. file_id={uploaded_file.id}: {e}")
+    if not uploaded_file.content_hash:
+        uploaded_file.content_hash = hash_file(uploaded_file.filepath)
+        db.commit()
+
+def is_normalized(uploaded_file) -> bool:
+    return bool((uploaded_file.media_info or {}).get('normalized'))
+
+def can_stream_normalization(uploaded_file, diarize) -> bool:
+    """Jobs sent to the API in one request can have their audio converted during the upload instead of in prepare_media."""
+    return STREAM_NORMALIZATION and not is_chunked(uploaded_file, diarize) and not is_normalized(uploaded_file)
+
+def needs_media_work(uploaded_file, diarize, stream_audio) -> bool:
+    """True if the job still needs ffmpeg work that belongs on the media workers before it can be uploaded."""
+    if is_chunked(uploaded_file, diarize):
+        return not chunks_ready(uploaded_file)
+    return not (stream_audio or is_normalized(uploaded_file))
+
+# Caps concurrent streaming encoders in a worker process (greenlets under gevent)
+_stream_encoders = threading.BoundedSemaphore(STREAM_MAX_ENCODERS)
+
+def transcribe_streamed(client, file_path, filename, file_id, convert_kwargs, timeline):
+    """
+    Send the file's normalized audio to the API while ffmpeg produces it: no converted copy
+    is written to disk, and the upload starts with ffmpeg's first output. The body can't be
+    replayed, so a failed attempt is retried from prepare_media's converted file.
+    """
+    started = time.time()
+    upload_name = os.path.splitext(filename or 'audio')[0] + NORMALIZED_EXTENSION
+    with _stream_encoders, normalized_audio_stream(file_path) as audio:
+        transcription = client.speech_to_text.convert(file=(upload_name, audio, 'audio/ogg'), **convert_kwargs)
+    timeline.record_upload('stream', audio.bytes_read)
+    timeline.data['first_byte_after'] = round(audio.first_byte_after or 0, 3)
+    logger.info(
+        f"[transcribe_file] Streamed {audio.bytes_read} bytes of normalized audio, first byte after "
+        f"{audio.first_byte_after or 0:.2f}s, {time.time() - started:.2f}s in total. file_id={file_id}"
+    )
+    return transcription
+
+def normalize_media_file(db, uploaded_file, timeline):
+    """Replace the upload on disk with its normalized audio (media.normalize_audio) and record the new format."""
+    original_path = uploaded_file.filepath
+    base, extension = os.path.splitext(original_path)
+    normalized_path = base + ('.16k' if extension == NORMALIZED_EXTENSION else '') + NORMALIZED_EXTENSION
+    was_video = uploaded_file.is_video
+    started = time.time()
+    with timeline.stage('normalize'):
+        duration = normalize_audio(original_path, normalized_path)
+    original_size, normalized_size = os.path.getsize(original_path), os.path.getsize(normalized_path)
+
+    uploaded_file.filepath = normalized_path
+    if duration and not uploaded_file.media_duration:
+        uploaded_file.media_duration = duration
+    media_info = dict(uploaded_file.media_info or {}, codec='opus', channels=1, sample_rate=NORMALIZED_SAMPLE_RATE, has_video=False, normalized=True)
+    if duration:
+        media_info['duration'] = duration
+    uploaded_file.media_info = media_info
+    uploaded_file.is_video = False
+    db.commit()
+    os.remove(original_path)
+    logger.info(
+        f"[normalize_media_file] file_id={uploaded_file.id}: {original_size} -> {normalized_size} bytes, "
+        f"{duration:.1f}s of audio in {time.time() - started:.2f}s"
+    )
+    if was_video:
+        publish_user_event(uploaded_file.user_id, {"file_id": uploaded_file.id, "status": "processing", "message": "Audio extracted from video file."})
+
+def fail_job(db, uploaded_file, message: str):
+    """Final failure of a job: mark it, tell the user and report it to the partner's callback_url."""
+    set_file_status(db, uploaded_file, 'error')
+    db.commit()
+    publish_user_event(uploaded_file.user_id, {"file_id": uploaded_file.id, "status": "error", "message": message})
+    schedule_callback(uploaded_file)
 
 @celery_app.task(
     bind=True,
@@ -139,10 +278,14 @@ def convert_transcription_to_format(transcription, output_format):
     retry_jitter=True,
     task_time_limit=7200
 )
-def transcribe_file(self, file_id: int, output_format: str, language: str, tag_audio_events: bool, diarize: bool):
+def transcribe_file(self, file_id: int, output_format: str, language: str, tag_audio_events: bool, diarize: bool, subtitle_profile: str = 'default'):
     """Transcribe file using ElevenLabs scribe_v1 model."""
     start_time = time.time()
     db = SessionLocal()
+    slot_held = False
+    timeline = None
+    finished = False
+    work_dir = None
     try:
         uploaded_file = db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).first()
         if not uploaded_file:
@@ -152,71 +295,80 @@ def transcribe_file(self, file_id: int, output_format: str, language: str, tag_a
         user_id = uploaded_file.user_id
         user = db.query(models.User).filter(models.User.id == user_id).first()
         user_email = user.email if user else "unknown"
-        redis_channel = f"user_{user_id}_updates"
 
         if uploaded_file.status == 'transcribed':
             logger.info(f"[transcribe_file] File already transcribed. file_id={file_id}, user_id={user_id}, user_email={user_email}")
-            redis_client.publish(redis_channel, json.dumps({"file_id": file_id, "status": "transcribed", "message": "Transcription already completed."}))
+            publish_user_event(user_id, {"file_id": file_id, "status": "transcribed", "message": "Transcription already completed."})
             return
 
+        is_service = user_email == scheduling.SERVICE_USER_EMAIL
+        if not is_service:
+            if not scheduling.acquire_slot(user_id, file_id):
+                # The user already has their share of workers busy; try again shortly
+                logger.info(f"[transcribe_file] Deferring file_id={file_id}: user_id={user_id} is at {scheduling.MAX_ACTIVE_JOBS_PER_USER} active jobs")
+                transcribe_file.apply_async(
+                    args=self.request.args, kwargs=self.request.kwargs,
+                    queue=scheduling.transcription_queue(uploaded_file.media_duration),
+                    countdown=scheduling.FAIR_SHARE_RETRY_DELAY
+                )
+                return
+            slot_held = True
+        timeline = JobTimeline(uploaded_file.timeline)
+        waited = scheduling.record_wait(file_id)
+        timeline.add_wait('queue_wait', waited)
+        if waited:
+            timeline.data['queue'] = waited['queue']
+        timeline.mark('started')
+        timeline.data['retries'] = self.request.retries
+
         logger.info(f"[transcribe_file] Starting transcription. file_id={file_id}, user_id={user_id}, user_email={user_email}, output_format={output_format}, language={language}, tag_audio_events={tag_audio_events}, diarize={diarize}")
-        redis_client.publish(redis_channel, json.dumps({"file_id": file_id, "status": "processing", "message": "Transcription job started."}))
+        publish_user_event(user_id, {"file_id": file_id, "status": "processing", "message": "Transcription job started."})
 
         api_key = os.getenv('ELEVENLABS_API_KEY')
         if not api_key:
             logger.error(f"[transcribe_file] No ElevenLabs API key. file_id={file_id}, user_id={user_id}")
-            uploaded_file.status = 'error'
-            db.commit()
-            redis_client.publish(redis_channel, json.dumps({"file_id": file_id, "status": "error", "message": "ElevenLabs API key not found."}))
+            fail_job(db, uploaded_file, "ElevenLabs API key not found.")
+            finished = True
             return
 
         if not os.path.exists(uploaded_file.filepath):
             logger.error(f"[transcribe_file] File not found on disk. path={uploaded_file.filepath}, user_id={user_id}")
-            uploaded_file.status = 'error'
-            db.commit()
-            redis_client.publish(redis_channel, json.dumps({"file_id": file_id, "status": "error", "message": "Uploaded file not found on server."}))
+            fail_job(db, uploaded_file, "Uploaded file not found on server.")
+            finished = True
             return
 
         file_size = os.path.getsize(uploaded_file.filepath)
         if file_size == 0:
             logger.error(f"[transcribe_file] File is empty. file_id={file_id}, user_id={user_id}")
-            uploaded_file.status = 'error'
-            db.commit()
-            redis_client.publish(redis_channel, json.dumps({"file_id": file_id, "status": "error", "message": "Uploaded file is empty."}))
+            fail_job(db, uploaded_file, "Uploaded file is empty.")
+            finished = True
             return
 
-        if uploaded_file.is_video:
-            original_file_path = uploaded_file.filepath
-            audio_file_path = os.path.splitext(original_file_path)[0] + ".mp3"
-            try:
-                logger.info(f"[transcribe_file] Extracting audio. file_id={file_id}, user_id={user_id}")
-                ffmpeg.input(original_file_path).output(audio_file_path, format='mp3', acodec='libmp3lame', ac=2, ar='44100').run(overwrite_output=True)
-                uploaded_file.filepath = audio_file_path
-                uploaded_file.filename = os.path.basename(audio_file_path)
-                uploaded_file.media_duration = get_media_duration(audio_file_path)
-                uploaded_file.is_video = False
-                db.commit()
-                if os.path.exists(original_file_path):
-                    os.remove(original_file_path)
-                redis_client.publish(redis_channel, json.dumps({"file_id": file_id, "status": "processing", "message": "Audio extracted from video file."}))
-            except Exception as e:
-                logger.exception(f"[transcribe_file] Audio extraction error. file_id={file_id}, user_id={user_id}")
-                uploaded_file.status = 'error'
-                db.commit()
-                redis_client.publish(redis_channel, json.dumps({"file_id": file_id, "status": "error", "message": "Failed to extract audio from video file."}))
+        # Normally done by prepare_media; jobs queued straight to transcribe_file get it here
+        probe_and_hash(db, uploaded_file, timeline)
+        media_duration = uploaded_file.media_duration or 0
+        cache_key = TranscriptionCache.make_key(uploaded_file.content_hash, language, diarize, tag_audio_events)
+        cached = transcription_cache.lookup(cache_key)
+        if cached is not None:
+            logger.info(f"[transcribe_file] Cache hit, skipping transcription API. file_id={file_id}, content_hash={uploaded_file.content_hash}")
+            transcript = Transcript.from_json(cached)
+            timeline.data['cache_hit'] = True
+        else:
+            # ffmpeg stays off these (gevent) workers: audio that still needs converting or
+            # cutting into chunks - a retry after a streamed upload, a cache entry that expired
+            # since prepare_media, a job queued before it existed - goes back to the media queue
+            stream_audio = self.request.retries == 0 and can_stream_normalization(uploaded_file, diarize)
+            if needs_media_work(uploaded_file, diarize, stream_audio):
+                logger.info(f"[transcribe_file] Handing file_id={file_id} back to prepare_media for ffmpeg work")
+                scheduling.mark_enqueued(file_id, 'media')
+                prepare_media.apply_async(
+                    args=[file_id, output_format, language, tag_audio_events, diarize],
+                    kwargs={"subtitle_profile": subtitle_profile, "priority": is_service, "allow_stream": False}
+                )
                 return
 
-        media_duration = uploaded_file.media_duration or get_media_duration(uploaded_file.filepath)
-        timeout_seconds = max(180, media_duration / 20)
-        client = ElevenLabs(api_key=api_key, timeout=Timeout(timeout=timeout_seconds, connect=10.0))
-        logger.info(f"[transcribe_file] Set timeout to {timeout_seconds} seconds for file_id={file_id}")
-
-        ELEVENLABS_LANGUAGE_MAP = {'fa': 'fas', 'en': 'eng', 'ar': 'ara', 'tr': 'tur', 'fr': 'fra'}
-        mapped_language = ELEVENLABS_LANGUAGE_MAP.get(language, language)
-
-        with open(uploaded_file.filepath, 'rb') as file_stream:
-            transcription = client.speech_to_text.convert(
-                file=file_stream,
+            mapped_language = ELEVENLABS_LANGUAGE_MAP.get(language, language)
+            convert_kwargs = dict(
                 model_id="scribe_v1",
                 language_code=mapped_language if language != 'auto' else None,
                 tag_audio_events=tag_audio_events,
@@ -224,47 +376,432 @@ def transcribe_file(self, file_id: int, output_format: str, language: str, tag_a
                 timestamps_granularity="word"
             )
 
-        output = convert_transcription_to_format(transcription, output_format)
+            # End the read transaction so the session doesn't hold a pooled connection
+            # for the minutes the API call takes (many run at once on a gevent worker);
+            # read what the call needs first, since touching the expired instance reconnects
+            file_path, filename = uploaded_file.filepath, uploaded_file.filename
+            chunks = uploaded_file.media_info['chunks'] if is_chunked(uploaded_file, diarize) else None
+            if chunks:
+                work_dir = chunk_dir(uploaded_file)
+            db.commit()
+
+            if chunks:
+                timeout_seconds = max(180, CHUNK_TARGET_SECONDS / 10)
+                client = ElevenLabs(api_key=api_key, timeout=Timeout(timeout=timeout_seconds, connect=10.0))
+                logger.info(f"[transcribe_file] Set per-chunk timeout to {timeout_seconds} seconds for file_id={file_id}")
+                with timeline.stage('api'):
+                    transcription = transcribe_in_chunks(client, chunks, file_id, convert_kwargs, timeline)
+            else:
+                timeout_seconds = max(180, media_duration / 20)
+                client = ElevenLabs(api_key=api_key, timeout=Timeout(timeout=timeout_seconds, connect=10.0))
+                logger.info(f"[transcribe_file] Set timeout to {timeout_seconds} seconds for file_id={file_id}")
+                with timeline.stage('api'):
+                    if stream_audio:
+                        transcription = transcribe_streamed(client, file_path, filename, file_id, convert_kwargs, timeline)
+                    else:
+                        with open(file_path, 'rb') as file_stream:
+                            transcription = client.speech_to_text.convert(file=file_stream, **convert_kwargs)
+                        timeline.record_upload('file', os.path.getsize(file_path))
+            transcript = Transcript.from_elevenlabs(transcription)
+            transcription_cache.store(cache_key, transcript.to_json())
+
+        profile = PROFILES.get(subtitle_profile, PROFILES['default'])
+        with timeline.stage('render'):
+            output = convert_transcription_to_format(transcript, output_format, profile)
         uploaded_file.transcription = output
-        uploaded_file.status = 'transcribed'
-
-        if user:
-            deduction = uploaded_file.media_duration / 60
-            logger.info(f"[transcribe_file] Deducting {deduction} minutes from user_id={user_id}, user_email={user_email}")
-            db.execute(
-                update(models.User)
-                .where(models.User.id == user_id)
-                .values(
-                    remaining_time=func.greatest(models.User.remaining_time - deduction, 0),
-                    total_used_time=models.User.total_used_time + deduction
+        uploaded_file.transcript_data = transcript.pack()
+        uploaded_file.exports = [models.TranscriptExport(format=export_key(output_format, profile.name), content=output)]
+        set_file_status(db, uploaded_file, 'transcribed')
+
+        with timeline.stage('db_commit'):
+            if user:
+                deduction = uploaded_file.media_duration / 60
+                logger.info(f"[transcribe_file] Deducting {deduction} minutes from user_id={user_id}, user_email={user_email}")
+                db.execute(
+                    update(models.User)
+                    .where(models.User.id == user_id)
+                    .values(
+                        remaining_time=func.greatest(models.User.remaining_time - deduction, 0),
+                        total_used_time=models.User.total_used_time + deduction
+                    )
                 )
-            )
-            db.commit()
+                db.commit()
+                invalidate_identity(user_id)
 
-        db.commit()
+            db.commit()
+        metrics.JOBS_FINISHED.labels('transcribed').inc()
+        finished = True
         processing_time = time.time() - start_time
         logger.info(f"[transcribe_file] Completed. file_id={file_id}, user_id={user_id}, user_email={user_email}, duration={processing_time:.2f}s")
-        redis_client.publish(redis_channel, json.dumps({"file_id": file_id, "status": "transcribed", "message": "Transcription completed."}))
+        publish_user_event(user_id, {"file_id": file_id, "status": "transcribed", "message": "Transcription completed."})
+        schedule_callback(uploaded_file)
 
     except Exception as e:
         logger.exception(f"[transcribe_file] Error transcribing file_id={file_id}: {e}")
-        uploaded_file.status = 'error'
+        # Discard the failed attempt so the status (and counters) change from what was committed
+        db.rollback()
+        set_file_status(db, uploaded_file, 'error')
         db.commit()
-        redis_client.publish(redis_channel, json.dumps({
+        metrics.JOBS_FINISHED.labels('error').inc()
+        publish_user_event(user_id, {
             "file_id": file_id,
             "status": "error",
             "message": "Transcription failed due to an internal error."
-        }))
+        })
+        if self.request.retries >= self.max_retries:
+            finished = True
+            schedule_callback(uploaded_file)
         if isinstance(e, Exception):
             self.retry(exc=e)
     finally:
+        if slot_held:
+            scheduling.release_slot(user_id, file_id)
+        if finished and work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        if timeline is not None:
+            timeline.add('processing', time.time() - start_time)
+            save_timeline(db, file_id, timeline, finished)
         db.close()
 
-def get_media_duration(file_path: str) -> float:
-    """Get media file duration in seconds."""
+def save_timeline(db, file_id: int, timeline: JobTimeline, finished: bool = False):
+    """
+    Store the job's timeline in its own UPDATE, after the task's last commit (so transcribe_file's
+    db_commit is included). finished stamps finished_at, which the latency report windows on.
+    """
+    values = {}
+    if finished:
+        values['finished_at'] = datetime.utcnow()
+        timeline.mark('finished', values['finished_at'])
     try:
-        probe = ffmpeg.probe(file_path)
-        return float(probe['format']['duration'])
+        db.execute(
+            update(models.UploadedFile)
+            .where(models.UploadedFile.id == file_id)
+            .values(timeline=timeline.to_json(), **values)
+        )
+        db.commit()
     except Exception as e:
-        logger.error(f"Error getting media duration for {file_path}: {e}")
-        return 0.0
+        db.rollback()
+        logger.warning(f"Could not save the timeline. file_id={file_id}: {e}")
+
+class IngestError(Exception):
+    """A download failure that retrying won't fix (too large, rejected, checksum mismatch)."""
+
+_download_session = None
+
+def download_session() -> requests.Session:
+    """Per-process session, so repeated downloads from a partner reuse connections."""
+    global _download_session
+    if _download_session is None:
+        _download_session = requests.Session()
+        _download_session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=10))
+        _download_session.mount('http://', HTTPAdapter(pool_connections=10, pool_maxsize=10))
+    return _download_session
+
+def download_with_resume(url, destination, headers=None, max_bytes=INGEST_MAX_BYTES):
+    """
+    Stream url into destination and return the sha256 of its bytes.
+
+    Data goes to destination + '.part' first; if that exists from an interrupted attempt,
+    only the rest is requested with a Range header (and the sha256 continues from the
+    bytes already on disk). A server that ignores Range gets a fresh download.
+    """
+    part_path = destination + '.part'
+    digest = hashlib.sha256()
+    offset = 0
+    if os.path.exists(part_path):
+        offset = os.path.getsize(part_path)
+        with open(part_path, 'rb') as f:
+            for block in iter(lambda: f.read(INGEST_CHUNK_SIZE), b''):
+                digest.update(block)
+    request_headers = dict(headers or {})
+    if offset:
+        request_headers['Range'] = f"bytes={offset}-"
+
+    with download_session().get(url, headers=request_headers, stream=True, timeout=(10, 60)) as response:
+        if offset and response.status_code == 416:
+            pass  # the previous attempt already received everything
+        else:
+            if response.status_code != 206 or not offset:
+                if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                    raise IngestError(f"Download rejected with HTTP {response.status_code}")
+                response.raise_for_status()
+                offset, digest = 0, hashlib.sha256()
+            length = response.headers.get('Content-Length')
+            if length and offset + int(length) > max_bytes:
+                raise IngestError(f"Remote file is larger than {max_bytes} bytes")
+            with open(part_path, 'ab' if offset else 'wb') as f:
+                for block in response.iter_content(chunk_size=INGEST_CHUNK_SIZE):
+                    offset += len(block)
+                    if offset > max_bytes:
+                        raise IngestError(f"Remote file is larger than {max_bytes} bytes")
+                    digest.update(block)
+                    f.write(block)
+    if offset == 0:
+        raise IngestError("Remote file is empty")
+    os.replace(part_path, destination)
+    return digest.hexdigest()
+
+def _download_key_name(file_id: int) -> str:
+    return f"download_key:{file_id}"
+
+def download_headers(file_id: int):
+    """Headers for fetching a service-API upload: the partner's download key, if one was given."""
+    key = redis_client.get(_download_key_name(file_id))
+    return {"X-Download-API-Key": key.decode('utf-8')} if key else None
+
+@celery_app.task(bind=True, max_retries=INGEST_MAX_RETRIES, task_time_limit=3600)
+def ingest_remote_audio(self, file_id: int, audio_url: str, headers: dict = None, expected_sha256: str = None):
+    """
+    Download a service-API upload to its UploadedFile.filepath; prepare_media is chained
+    after it by enqueue_remote_transcription. Network errors are retried with backoff and
+    resume where the last attempt stopped; a failed ingest marks the file as error and
+    raises, which stops the chain. The download key is read from Redis (download_headers);
+    headers is only set by messages queued before that.
+    """
+    db = SessionLocal()
+    timeline = None
+    finished = False
+    retrying = False
+    try:
+        uploaded_file = db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).first()
+        if not uploaded_file:
+            raise IngestError(f"File {file_id} not found in DB")
+        user_id = uploaded_file.user_id
+        timeline = JobTimeline(uploaded_file.timeline)
+        timeline.add_wait('download_wait', scheduling.record_wait(file_id))
+        start_time = time.time()
+        try:
+            content_hash = download_with_resume(audio_url, uploaded_file.filepath, headers or download_headers(file_id))
+            if expected_sha256 and content_hash != expected_sha256.lower():
+                os.remove(uploaded_file.filepath)
+                raise IngestError("Checksum mismatch")
+        except requests.RequestException as e:
+            if self.request.retries < self.max_retries:
+                logger.warning(f"[ingest_remote_audio] Download interrupted, retrying. file_id={file_id}: {e}")
+                retrying = True
+                raise self.retry(exc=e, countdown=min(15 * 2 ** self.request.retries, 600))
+            error = f"Download failed after {self.request.retries + 1} attempts: {e}"
+        except IngestError as e:
+            error = str(e)
+        else:
+            error = None
+
+        if error:
+            logger.error(f"[ingest_remote_audio] {error}. file_id={file_id}, url={audio_url}")
+            part_path = uploaded_file.filepath + '.part'
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            fail_job(db, uploaded_file, "Could not download audio file.")
+            finished = True
+            raise IngestError(error)
+
+        uploaded_file.content_hash = content_hash
+        uploaded_file.status = 'pending'
+        db.commit()
+        scheduling.mark_enqueued(file_id, 'media')
+        size = os.path.getsize(uploaded_file.filepath)
+        logger.info(f"[ingest_remote_audio] Downloaded {size} bytes in {time.time() - start_time:.2f}s. file_id={file_id}")
+    finally:
+        if not retrying:
+            redis_client.delete(_download_key_name(file_id))
+        if timeline is not None:
+            timeline.add('download', time.time() - start_time)
+            save_timeline(db, file_id, timeline, finished)
+        db.close()
+
+@celery_app.task(bind=True, max_retries=2, default_retry_delay=30)
+def prepare_media(self, file_id: int, output_format: str, language: str, tag_audio_events: bool, diarize: bool,
+                  subtitle_profile: str = 'default', priority: bool = False, allow_stream: bool = True):
+    """
+    CPU-bound stage, run on the prefork `media` workers: convert the upload to 16 kHz mono
+    Opus (normalize_media_file) unless its transcript is already cached or the conversion
+    will be streamed into the upload (never when transcribe_file sent the job back, i.e.
+    allow_stream is False), cut long media into chunks (prepare_chunks), then hand the job
+    to its transcription lane.
+    """
+    db = SessionLocal()
+    try:
+        uploaded_file = db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).first()
+        if not uploaded_file:
+            logger.error(f"[prepare_media] File not found in DB. file_id={file_id}")
+            return
+        timeline = JobTimeline(uploaded_file.timeline)
+        timeline.add_wait('media_wait', scheduling.record_wait(file_id))
+        started = time.time()
+        try:
+            if not uploaded_file.content_hash:
+                uploaded_file.content_hash = hash_file(uploaded_file.filepath)
+                db.commit()
+            cache_key = TranscriptionCache.make_key(uploaded_file.content_hash, language, diarize, tag_audio_events)
+            probe_and_hash(db, uploaded_file, timeline)
+            cached = transcription_cache.is_cached(cache_key)
+            if not (is_normalized(uploaded_file) or cached or (allow_stream and can_stream_normalization(uploaded_file, diarize))):
+                normalize_media_file(db, uploaded_file, timeline)
+            if not cached and is_chunked(uploaded_file, diarize) and not chunks_ready(uploaded_file):
+                prepare_chunks(db, uploaded_file, timeline)
+        except Exception as e:
+            logger.exception(f"[prepare_media] Error preparing media. file_id={file_id}: {e}")
+            db.rollback()
+            fail_job(db, uploaded_file, "Failed to prepare media file.")
+            timeline.add('prepare', time.time() - started)
+            save_timeline(db, file_id, timeline, finished=True)
+            return
+        timeline.add('prepare', time.time() - started)
+        save_timeline(db, file_id, timeline)
+        dispatch_transcription(uploaded_file, output_format, language, tag_audio_events, diarize, subtitle_profile, priority)
+    finally:
+        db.close()
+
+def dispatch_transcription(uploaded_file, output_format, language, tag_audio_events, diarize, subtitle_profile='default', priority=False):
+    """Queue transcribe_file on the lane for the file's duration (or the priority lane)."""
+    queue = scheduling.transcription_queue(uploaded_file.media_duration, is_service=priority)
+    scheduling.mark_enqueued(uploaded_file.id, queue)
+    return transcribe_file.apply_async(
+        args=[uploaded_file.id, output_format, language, tag_audio_events, diarize],
+        kwargs={"subtitle_profile": subtitle_profile}, queue=queue
+    )
+
+def enqueue_transcription(uploaded_file, output_format, language, tag_audio_events, diarize, subtitle_profile='default'):
+    """Queue an interactive upload: prepare_media normalizes it, then dispatches it to its lane."""
+    if is_normalized(uploaded_file):
+        return dispatch_transcription(uploaded_file, output_format, language, tag_audio_events, diarize, subtitle_profile)
+    scheduling.mark_enqueued(uploaded_file.id, 'media')
+    return prepare_media.delay(uploaded_file.id, output_format, language, tag_audio_events, diarize, subtitle_profile)
+
+def enqueue_remote_transcription(file_id, audio_url, download_api_key, expected_sha256, language):
+    """Download, normalize, then transcribe on the priority lane; the service API always asks for diarized JSON."""
+    if download_api_key:
+        redis_client.set(_download_key_name(file_id), download_api_key, ex=DOWNLOAD_KEY_TTL)
+    scheduling.mark_enqueued(file_id, 'default')
+    return chain(
+        ingest_remote_audio.si(file_id, audio_url, expected_sha256=expected_sha256),
+        prepare_media.si(file_id, 'json', language, False, True, priority=True),
+    ).delay()
+
+def schedule_callback(uploaded_file):
+    """Queue delivery of a service-API job's final status to its callback_url, if it has one."""
+    if not uploaded_file.callback_url:
+        return
+    if callbacks.CALLBACK_BATCH_WINDOW > 0:
+        host = callbacks.callback_host(uploaded_file.callback_url)
+        try:
+            if callbacks.add_to_batch(host, uploaded_file.id):
+                deliver_callback_batch.apply_async(args=[host], countdown=callbacks.CALLBACK_BATCH_WINDOW)
+            return
+        except redis.RedisError as e:
+            logger.error(f"[schedule_callback] Batch queue unavailable, delivering file_id={uploaded_file.id} alone: {e}")
+    deliver_callback.delay(uploaded_file.id)
+
+def _record_callback(db, uploaded_file, status, error=None):
+    uploaded_file.callback_status = status
+    uploaded_file.callback_attempts = (uploaded_file.callback_attempts or 0) + 1
+    uploaded_file.callback_error = error
+    if status == 'delivered':
+        uploaded_file.callback_delivered_at = datetime.utcnow()
+    db.commit()
+
+@celery_app.task(bind=True, max_retries=callbacks.CALLBACK_MAX_RETRIES, acks_late=True)
+def deliver_callback(self, file_id: int):
+    """
+    POST one job's result to its callback_url. Failures are retried with exponential
+    backoff; a 4xx rejection or running out of retries leaves callback_status='dead'
+    (scripts/redeliver_callbacks.py queues those again).
+    """
+    db = SessionLocal()
+    try:
+        uploaded_file = db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).first()
+        if not uploaded_file or not uploaded_file.callback_url:
+            logger.warning(f"[deliver_callback] Nothing to deliver for file_id={file_id}")
+            return
+        if uploaded_file.callback_status == 'delivered':
+            return
+        try:
+            callbacks.post_callback(uploaded_file.callback_url, callbacks.callback_payload(uploaded_file))
+        except callbacks.PermanentCallbackError as e:
+            logger.error(f"[deliver_callback] Rejected, giving up. file_id={file_id}: {e}")
+            _record_callback(db, uploaded_file, 'dead', str(e))
+            return
+        except requests.RequestException as e:
+            if self.request.retries >= self.max_retries:
+                logger.error(f"[deliver_callback] Giving up after {self.request.retries + 1} attempts. file_id={file_id}: {e}")
+                _record_callback(db, uploaded_file, 'dead', str(e))
+                return
+            _record_callback(db, uploaded_file, 'retrying', str(e))
+            raise self.retry(exc=e, countdown=callbacks.retry_delay(self.request.retries))
+        _record_callback(db, uploaded_file, 'delivered')
+        logger.info(f"[deliver_callback] Delivered. file_id={file_id}")
+    finally:
+        db.close()
+
+@celery_app.task
+def deliver_callback_batch(host: str):
+    """
+    Batch mode: POST the results queued for a host as {"results": [...]}, one request per
+    callback_url. A failed batch falls back to per-file deliver_callback tasks, which own
+    retries and dead-lettering.
+    """
+    file_ids, more = callbacks.take_batch(host)
+    if more:
+        deliver_callback_batch.apply_async(args=[host], countdown=callbacks.CALLBACK_BATCH_WINDOW)
+    if not file_ids:
+        return
+    db = SessionLocal()
+    try:
+        files = db.query(models.UploadedFile).filter(models.UploadedFile.id.in_(file_ids)).all()
+        by_url = {}
+        for uploaded_file in files:
+            if uploaded_file.callback_url and uploaded_file.callback_status != 'delivered':
+                by_url.setdefault(uploaded_file.callback_url, []).append(uploaded_file)
+        for url, group in by_url.items():
+            try:
+                callbacks.post_callback(url, {"results": [callbacks.callback_payload(f) for f in group]})
+            except (requests.RequestException, callbacks.PermanentCallbackError) as e:
+                logger.warning(f"[deliver_callback_batch] Batch of {len(group)} to {host} failed, delivering one by one: {e}")
+                for uploaded_file in group:
+                    deliver_callback.delay(uploaded_file.id)
+                continue
+            for uploaded_file in group:
+                _record_callback(db, uploaded_file, 'delivered')
+            logger.info(f"[deliver_callback_batch] Delivered {len(group)} results to {host}")
+    finally:
+        db.close()
+
+SUMMARY_PENDING_TTL = 600  # seconds; also how long a crashed summarization blocks a new request
+
+def summary_pending_key(file_id: int) -> str:
+    return f"summary_pending:{file_id}"
+
+@celery_app.task(bind=True, max_retries=2, default_retry_delay=30)
+def summarize_file(self, file_id: int):
+    """
+    Summarize a transcription (map-reduce over chunks for long ones, see summaries.py),
+    store it on the file and the summary cache, and push it to the user over SSE.
+    """
+    db = SessionLocal()
+    try:
+        uploaded_file = db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).first()
+        if not uploaded_file or not uploaded_file.transcription:
+            logger.error(f"[summarize_file] Nothing to summarize. file_id={file_id}")
+            redis_client.delete(summary_pending_key(file_id))
+            return
+        user_id, text = uploaded_file.user_id, uploaded_file.transcription
+        db.commit()  # don't hold a connection during the model calls
+        start_time = time.time()
+        try:
+            summary = summaries.cached_summary(text) or summaries.summarize_text(text)
+        except Exception as e:
+            if self.request.retries < self.max_retries:
+                logger.warning(f"[summarize_file] Attempt failed, retrying. file_id={file_id}: {e}")
+                raise self.retry(exc=e)
+            logger.exception(f"[summarize_file] Failed. file_id={file_id}: {e}")
+            redis_client.delete(summary_pending_key(file_id))
+            publish_user_event(user_id, {"file_id": file_id, "status": "transcribed", "summary_error": True, "message": "Failed to generate summary."})
+            return
+        summaries.store_summary(text, summary)
+        db.query(models.UploadedFile).filter(models.UploadedFile.id == file_id).update({"summary": summary}, synchronize_session=False)
+        db.commit()
+        redis_client.delete(summary_pending_key(file_id))
+        logger.info(f"[summarize_file] Done in {time.time() - start_time:.2f}s. file_id={file_id}, chars={len(text)}")
+        publish_user_event(user_id, {"file_id": file_id, "status": "transcribed", "summary": summary, "message": "Summary ready."})
+    finally:
+        db.close()
@@ -0,0 +1,66 @@
+# backend/timeline.py
+
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+import metrics
+
+# Upper bounds (seconds of media) of the duration buckets the latency report groups by
+DURATION_BUCKETS = ((60, '<1m'), (600, '1-10m'), (1800, '10-30m'), (3600, '30-60m'))
+LONGEST_BUCKET = '60m+'
+
+class JobTimeline:
+    """
+    Where one transcription job spent its time, kept on UploadedFile.timeline as JSON:
+
+        {"enqueued_at": ..., "started_at": ..., "finished_at": ..., "queue": "transcription_short",
+         "retries": 0, "api_mode": "stream", "bytes_sent": 1234567, "first_byte_after": 0.4,
+         "stages": {"media_wait": 1.5, "normalize": 4.0, "queue_wait": 3.1, "api": 88.7,
+                    "render": 0.1, "db_commit": 0.02, "processing": 90.3}}
+
+    enqueued_at is when the job entered its first queue; every hop after that adds its wait
+    (download_wait, media_wait, queue_wait). "prepare" and "processing" are the wall times of
+    prepare_media and transcribe_file, which include their probe/normalize/api/... stages.
+    finished_at is only set once the job is transcribed or has failed for good. Stage times
+    add up over retries, so a job that retried shows the time it really cost. Stages timed
+    with stage() also feed the Prometheus histogram (metrics.STAGE_SECONDS).
+    """
+
+    def __init__(self, data: Optional[dict] = None):
+        self.data = dict(data or {})
+        self.data['stages'] = dict(self.data.get('stages') or {})
+        self._lock = threading.Lock()  # chunks upload from a thread pool
+
+    def mark(self, event: str, when: Optional[datetime] = None):
+        self.data[f"{event}_at"] = (when or datetime.utcnow()).isoformat()
+
+    def add_wait(self, stage: str, waited: Optional[dict]):
+        """Record a scheduling.record_wait() result as stage; the first one dates the job."""
+        if waited:
+            self.data.setdefault('enqueued_at', datetime.utcfromtimestamp(waited['at']).isoformat())
+            self.add(stage, waited['wait'])
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.data['stages'][stage] = round(self.data['stages'].get(stage, 0.0) + seconds, 3)
+
+    @contextmanager
+    def stage(self, stage: str):
+        started = time.perf_counter()
+        try:
+            with metrics.stage_timer(stage):
+                yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def record_upload(self, mode: str, size: int):
+        metrics.BYTES_UPLOADED.labels(mode).inc(size)
+        with self._lock:
+            self.data['api_mode'] = mode
+            self.data['bytes_sent'] = self.data.get('bytes_sent', 0) + size
+
+    def to_json(self) -> dict:
+        with self._lock:
+            return dict(self.data, stages=dict(self.data['stages']))
@@ -0,0 +1,100 @@
+# backend/transcript.py
+
+import json
+import zlib
+from typing import List, NamedTuple, Optional
+
+class Word(NamedTuple):
+    text: str
+    start: float
+    end: float
+    type: str
+    speaker_id: Optional[str] = None
+
+class Transcript:
+    """
+    Canonical word-level transcript, independent of the STT provider's response types.
+
+    Words are held column-wise (parallel arrays of text, start/end in milliseconds,
+    type and speaker_id), which compresses far better than a list of objects.
+    pack()/unpack() give the zlib-compressed form stored on UploadedFile; json() renders
+    it back in the shape of the ElevenLabs response. Only the fields above are kept, so
+    provider extras (logprob, characters, ...) are dropped and times are rounded to ms.
+    """
+
+    VERSION = 1
+
+    def __init__(self, text: str, columns: dict, language_code: Optional[str] = None, language_probability: Optional[float] = None):
+        self.text = text
+        self.columns = columns
+        self.language_code = language_code
+        self.language_probability = language_probability
+        self._words = None
+
+    @classmethod
+    def from_words(cls, words, text: Optional[str] = None, language_code=None, language_probability=None) -> "Transcript":
+        columns = {"text": [], "start": [], "end": [], "type": [], "speaker_id": []}
+        for word in words:
+            columns["text"].append(word.text)
+            columns["start"].append(int(round((word.start or 0.0) * 1000)))
+            columns["end"].append(int(round((word.end or 0.0) * 1000)))
+            columns["type"].append(word.type)
+            columns["speaker_id"].append(getattr(word, 'speaker_id', None))
+        if text is None:
+            text = "".join(columns["text"]).strip()
+        return cls(text, columns, language_code, language_probability)
+
+    @classmethod
+    def from_elevenlabs(cls, transcription) -> "Transcript":
+        return cls.from_words(
+            transcription.words,
+            text=transcription.text,
+            language_code=getattr(transcription, 'language_code', None),
+            language_probability=getattr(transcription, 'language_probability', None),
+        )
+
+    @property
+    def words(self) -> List[Word]:
+        if self._words is None:
+            c = self.columns
+            self._words = [
+                Word(text, start / 1000, end / 1000, word_type, speaker)
+                for text, start, end, word_type, speaker in zip(c["text"], c["start"], c["end"], c["type"], c["speaker_id"])
+            ]
+        return self._words
+
+    def to_json(self) -> str:
+        """Compact columnar JSON, the form used by the cache and by pack()."""
+        return json.dumps({
+            "v": self.VERSION,
+            "language_code": self.language_code,
+            "language_probability": self.language_probability,
+            "text": self.text,
+            "words": self.columns,
+        }, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, data: str) -> "Transcript":
+        payload = json.loads(data)
+        return cls(payload["text"], payload["words"], payload.get("language_code"), payload.get("language_probability"))
+
+    def pack(self) -> bytes:
+        return zlib.compress(self.to_json().encode('utf-8'), 6)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "Transcript":
+        return cls.from_json(zlib.decompress(data).decode('utf-8'))
+
+    def json(self) -> str:
+        """
+        Provider-style JSON: a list of word objects with text/start/end/type/speaker_id.
+
+        This is a format change from the raw response dump 'json' exports used to be: other
+        provider word fields are not kept, and start/end carry millisecond precision.
+        """
+        return json.dumps({
+            "language_code": self.language_code,
+            "language_probability": self.language_probability,
+            "text": self.text,
+            "words": [word._asdict() for word in self.words],
+        }, ensure_ascii=False)
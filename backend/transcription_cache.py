@@ -0,0 +1,121 @@
+# backend/transcription_cache.py
+
+import os
+import time
+import zlib
+from typing import Optional
+import redis
+from logging_config import logger
+
+CACHE_MAX_BYTES = int(os.getenv('TRANSCRIPTION_CACHE_MAX_BYTES', str(1024 * 1024 * 1024)))  # compressed bytes
+CACHE_MAX_AGE = int(os.getenv('TRANSCRIPTION_CACHE_MAX_AGE', str(30 * 24 * 3600)))  # seconds
+# Bump whenever the stored payload changes shape; v2 holds Transcript.to_json() columns.
+# Entries under an older prefix are never read again and age out on their TTL.
+CACHE_FORMAT_VERSION = 2
+
+class TranscriptionCache:
+    """
+    Content-addressed store of raw word-level transcriptions in Redis.
+
+    Entries are keyed on (content hash, language, diarize, tag_audio_events) and stored
+    zlib-compressed with a TTL of `max_age`. A sorted set tracks last access so the least
+    recently used entries are evicted once the total stored size exceeds `max_bytes`.
+    """
+
+    def __init__(self, redis_client, max_bytes: int = CACHE_MAX_BYTES, max_age: int = CACHE_MAX_AGE, prefix: str = f'tcache:v{CACHE_FORMAT_VERSION}'):
+        self.redis = redis_client
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.prefix = prefix
+        self._lru_key = f"{prefix}:lru"
+        self._sizes_key = f"{prefix}:sizes"
+        self._bytes_key = f"{prefix}:bytes"
+        self._hits_key = f"{prefix}:hits"
+        self._misses_key = f"{prefix}:misses"
+
+    @staticmethod
+    def make_key(content_hash: str, language: str, diarize: bool, tag_audio_events: bool) -> str:
+        return f"{content_hash}:{language}:{int(bool(diarize))}:{int(bool(tag_audio_events))}"
+
+    def _entry_key(self, key: str) -> str:
+        return f"{self.prefix}:entry:{key}"
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached transcription JSON for key, or None on a miss."""
+        data = self.redis.get(self._entry_key(key))
+        if data is None:
+            self.redis.incr(self._misses_key)
+            self._forget(key)
+            return None
+        self.redis.pipeline().zadd(self._lru_key, {key: time.time()}).incr(self._hits_key).execute()
+        return zlib.decompress(data).decode('utf-8')
+
+    def contains(self, key: str) -> bool:
+        """Whether key has an entry, without fetching it or counting a hit."""
+        return bool(self.redis.exists(self._entry_key(key)))
+
+    def put(self, key: str, payload: str):
+        data = zlib.compress(payload.encode('utf-8'))
+        previous = self.redis.hget(self._sizes_key, key)
+        pipe = self.redis.pipeline()
+        pipe.set(self._entry_key(key), data, ex=self.max_age)
+        pipe.zadd(self._lru_key, {key: time.time()})
+        pipe.hset(self._sizes_key, key, len(data))
+        pipe.incrby(self._bytes_key, len(data) - int(previous or 0))
+        pipe.execute()
+        self._evict()
+
+    def _forget(self, key: str):
+        size = self.redis.hget(self._sizes_key, key)
+        pipe = self.redis.pipeline()
+        pipe.delete(self._entry_key(key))
+        pipe.zrem(self._lru_key, key)
+        pipe.hdel(self._sizes_key, key)
+        if size is not None:
+            pipe.decrby(self._bytes_key, int(size))
+        pipe.execute()
+
+    def _evict(self):
+        # Age: anything not touched for max_age has also outlived its TTL
+        for key in self.redis.zrangebyscore(self._lru_key, '-inf', time.time() - self.max_age):
+            self._forget(key.decode('utf-8'))
+        # Size: drop least recently used entries until we are back under budget
+        while int(self.redis.get(self._bytes_key) or 0) > self.max_bytes:
+            oldest = self.redis.zrange(self._lru_key, 0, 0)
+            if not oldest:
+                break
+            self._forget(oldest[0].decode('utf-8'))
+
+    def stats(self) -> dict:
+        hits, misses, total_bytes = self.redis.mget(self._hits_key, self._misses_key, self._bytes_key)
+        return {
+            "hits": int(hits or 0),
+            "misses": int(misses or 0),
+            "entries": self.redis.zcard(self._lru_key),
+            "bytes": int(total_bytes or 0),
+            "max_bytes": self.max_bytes,
+            "max_age": self.max_age,
+        }
+
+transcription_cache = TranscriptionCache(redis.Redis(host='redis', port=6379, db=0))
+
+def lookup(key: str) -> Optional[str]:
+    """Cache read that never fails the caller; Redis errors count as a miss."""
+    try:
+        return transcription_cache.get(key)
+    except Exception as e:
+        logger.warning(f"Transcription cache read failed for {key}: {e}")
+        return None
+
+def is_cached(key: str) -> bool:
+    try:
+        return transcription_cache.contains(key)
+    except Exception as e:
+        logger.warning(f"Transcription cache check failed for {key}: {e}")
+        return False
+
+def store(key: str, payload: str):
+    try:
+        transcription_cache.put(key, payload)
+    except Exception as e:
+        logger.warning(f"Transcription cache write failed for {key}: {e}")
@@ -0,0 +1,47 @@
+# backend/user_stats.py
+
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import update, func
+from sqlalchemy.orm import Session
+import models
+
+# File statuses counted by User.successful_jobs and User.failed_jobs
+SUCCESS_STATUSES = ('transcribed',)
+FAILURE_STATUSES = ('error', 'failed')
+
+def apply_status_change(db: Session, user_id: Optional[int], old_status: Optional[str], new_status: Optional[str]):
+    """
+    Adjust the user's job counters for one file moving from old_status to new_status.
+
+    The counters always equal the number of the user's files in each status (a retried
+    job that fails and then succeeds moves from failed to successful), so
+    scripts/reconcile_user_stats.py finds nothing to fix when every transition goes
+    through here. The UPDATE is relative and runs in the caller's transaction.
+    """
+    successful = (new_status in SUCCESS_STATUSES) - (old_status in SUCCESS_STATUSES)
+    failed = (new_status in FAILURE_STATUSES) - (old_status in FAILURE_STATUSES)
+    if not user_id or not (successful or failed):
+        return
+    db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(
+            successful_jobs=func.coalesce(models.User.successful_jobs, 0) + successful,
+            failed_jobs=func.coalesce(models.User.failed_jobs, 0) + failed,
+        )
+    )
+
+def set_file_status(db: Session, uploaded_file: models.UploadedFile, status: str):
+    """Set uploaded_file.status and keep its owner's counters in step; the caller commits."""
+    old_status = uploaded_file.status
+    uploaded_file.status = status
+    apply_status_change(db, uploaded_file.user_id, old_status, status)
+
+def forget_file(db: Session, uploaded_file: models.UploadedFile):
+    """Take a file that is about to be deleted out of its owner's counters."""
+    apply_status_change(db, uploaded_file.user_id, uploaded_file.status, None)
+
+def record_login(user: models.User):
+    # Naive UTC, like UserActivity.timestamp, so backfilled and live values compare
+    user.last_login = datetime.utcnow()
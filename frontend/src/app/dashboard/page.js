@@ -66,6 +66,27 @@ export default function Dashboard() {
 
     const { reconnect } = useSSE((data) => {
         console.log('SSE message received:', data);
+        if (data.resync) {
+            // Missed updates are no longer in the event stream; reload the list once
+            fetchFiles(currentPage);
+            fetchUser();
+            return;
+        }
+        if (data.summary || data.summary_error) {
+            // Result of a summary request that was queued (202 from /summarize)
+            setSummarizingFiles((prev) => ({ ...prev, [data.file_id]: false }));
+            if (data.summary) {
+                setFiles((prevFiles) =>
+                    prevFiles.map((file) =>
+                        file.id === data.file_id ? { ...file, summary: data.summary } : file
+                    )
+                );
+                setExpandedSummaries((prev) => ({ ...prev, [data.file_id]: true }));
+            } else {
+                alert(t('summary_failed') || 'Failed to generate summary');
+            }
+            return;
+        }
         setFiles((prevFiles) => {
             const fileIndex = prevFiles.findIndex((f) => f.id === data.file_id);
             if (fileIndex !== -1) {
@@ -212,13 +233,17 @@ export default function Dashboard() {
             return;
         }
         
+        let pending = false;
         try {
             setSummarizingFiles((prev) => ({ ...prev, [fileId]: true }));
             const res = await fetch(`${API_URL}/files/${fileId}/summarize`, {
                 method: 'POST',
                 credentials: 'include',
             });
-            if (res.ok) {
+            if (res.status === 202) {
+                // Long transcripts are summarized in the background; the result comes over SSE
+                pending = true;
+            } else if (res.ok) {
                 const data = await res.json();
                 setFiles((prevFiles) =>
                     prevFiles.map((file) =>
@@ -233,7 +258,9 @@ export default function Dashboard() {
             console.error('Error generating summary:', err);
             alert(t('summary_error') || 'Error generating summary');
         } finally {
-            setSummarizingFiles((prev) => ({ ...prev, [fileId]: false }));
+            if (!pending) {
+                setSummarizingFiles((prev) => ({ ...prev, [fileId]: false }));
+            }
         }
     };
     
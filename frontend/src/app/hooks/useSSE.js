@@ -3,6 +3,7 @@ import { useEffect, useRef } from 'react';
 
 export default function useSSE(onMessage) {
     const eventSourceRef = useRef(null);
+    const lastEventIdRef = useRef('');
 
     useEffect(() => {
         const API_URL = process.env.NEXT_PUBLIC_API_URL;
@@ -13,11 +14,16 @@ export default function useSSE(onMessage) {
                 eventSourceRef.current.close();
             }
             console.log('Connecting to SSE...');
-            const eventSource = new EventSource(`${API_URL}/api/sse`, { withCredentials: true });
+            // New EventSource objects don't resend Last-Event-ID, so pass the resume point explicitly
+            const query = lastEventIdRef.current ? `?last_event_id=${encodeURIComponent(lastEventIdRef.current)}` : '';
+            const eventSource = new EventSource(`${API_URL}/api/sse${query}`, { withCredentials: true });
             eventSourceRef.current = eventSource;
 
             // Handle incoming messages
             eventSource.onmessage = (event) => {
+                if (event.lastEventId) {
+                    lastEventIdRef.current = event.lastEventId;
+                }
                 try {
                     if (event.data === ': keepalive') {
                         console.log('Received keep-alive');